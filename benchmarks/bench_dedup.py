@@ -0,0 +1,50 @@
+"""Microbenchmark: per-post dedup cost as the number of watched accounts grows.
+
+Compares the old list-based check-and-trim loop with BoundedSeenSet. Each
+account is polled for one cycle of ``POSTS_PER_CYCLE`` posts, half of them
+already seen. Run with ``python benchmarks/bench_dedup.py``.
+"""
+import time
+from xcryptowatch.dedup import BoundedSeenSet
+
+POSTS_PER_CYCLE = 10
+HISTORY_PER_ACCOUNT = 100
+ACCOUNT_COUNTS = [10, 100, 1000, 5000]
+
+def list_cycle(watched, accounts, cycle):
+    cap = HISTORY_PER_ACCOUNT * accounts
+    for account in range(accounts):
+        for n in range(POSTS_PER_CYCLE):
+            post_id = (account, cycle * POSTS_PER_CYCLE // 2 + n)
+            if post_id not in watched:
+                watched.append(post_id)
+                if len(watched) > cap:
+                    watched = watched[-cap:]
+    return watched
+
+def set_cycle(seen, accounts, cycle):
+    for account in range(accounts):
+        for n in range(POSTS_PER_CYCLE):
+            seen.add(account, cycle * POSTS_PER_CYCLE // 2 + n)
+    return seen
+
+def bench(accounts, cycle_fn, structure):
+    """Return the cost of one steady-state cycle in microseconds per post."""
+    warmup = 2 * HISTORY_PER_ACCOUNT // (POSTS_PER_CYCLE // 2) if accounts <= 100 else 3
+    for cycle in range(warmup):
+        structure = cycle_fn(structure, accounts, cycle)
+    start = time.perf_counter()
+    cycle_fn(structure, accounts, warmup)
+    elapsed = time.perf_counter() - start
+    return elapsed / (accounts * POSTS_PER_CYCLE) * 1e6
+
+def main():
+    print(f"{'accounts':>9} {'list us/post':>14} {'set us/post':>13}")
+    for accounts in ACCOUNT_COUNTS:
+        # The list version is quadratic; past 1000 accounts it takes minutes
+        list_cost = f"{bench(accounts, list_cycle, []):.2f}" if accounts <= 1000 else "skipped"
+        set_cost = bench(accounts, set_cycle, BoundedSeenSet(HISTORY_PER_ACCOUNT))
+        print(f"{accounts:>9} {list_cost:>14} {set_cost:>13.2f}")
+
+if __name__ == "__main__":
+    main()
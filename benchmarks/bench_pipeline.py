@@ -0,0 +1,322 @@
+"""End-to-end benchmark: watchers -> analysis -> notification, fully offline.
+
+Drives the real ``watch_tweets``, ``watch_truths`` and ``watch_bluesky``
+loops, the analysis pipeline and the outbox/SMTP path with synthetic load.
+Only the remote ends are replaced:
+
+- in-process fake Twitter, Truth Social and Bluesky clients, which publish
+  posts at a steady rate across all accounts
+- a fake OpenAI client with configurable latency and error rate
+- a local aiosmtpd sink standing in for the mail server
+
+Time is compressed by ``--speedup``: the watchers' check interval (one
+minute) and the posting rate are both scaled, so with the defaults ten real
+seconds cover an hour of 10,000 posts across 1,000 accounts.
+
+Reports posts/sec, p50/p99 latency from the moment a post is fetched to its
+analysis and (for posts that mention crypto) to its delivery at the SMTP
+sink, plus peak memory. Requires ``pip install aiosmtpd``.
+Run with ``python benchmarks/bench_pipeline.py [--accounts N] [--posts-per-hour N] ...``.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import random
+import re
+import resource
+import statistics
+import tempfile
+import time
+import types
+import warnings
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+import xcryptowatch.gpt as gpt
+from xcryptowatch import metrics
+import xcryptowatch.mail as mail
+import xcryptowatch.pipeline as pipeline
+import xcryptowatch.scheduler as scheduler
+import xcryptowatch.social.bluesky as bluesky
+import xcryptowatch.social.truth as truth
+import xcryptowatch.social.twitter as twitter
+from xcryptowatch.log import configure_logging, shutdown_logging
+from xcryptowatch.store import setup_store
+
+HOST, PORT = "127.0.0.1", 8026
+MENTION_RATIO = 0.3  # Share of synthetic posts that mention crypto
+POST_TOKEN = re.compile(r"#p(\d+)")
+
+fetched_at = {}     # post id -> when a fake client first returned it (new or not)
+analyzed_at = {}    # post id -> when the pipeline finished analyzing it
+delivered_at = {}   # post id -> when the SMTP sink received its notification
+counters = {"openai_requests": 0, "openai_errors": 0}
+
+class SyntheticFeed:
+    """Posts spread evenly over ``accounts`` at ``rate`` posts per real second in total.
+
+    Post ids increase with creation time across all accounts, like snowflake ids.
+    """
+
+    def __init__(self, accounts, rate):
+        self.accounts = accounts
+        self.period = accounts / rate  # seconds between two posts of one account
+        self.start = time.time()
+
+    def posts(self, account, after_id=None, after_time=None, limit=None):
+        """Return (id, created_at, text) of the account's posts so far, newest first."""
+        now = time.time()
+        offset = self.start + account * self.period / self.accounts
+        newest = int((now - offset) // self.period)
+        if after_id is not None:
+            oldest = (int(after_id) - account - 1) // self.accounts + 1
+        elif after_time is not None:
+            oldest = max(0, int((after_time - offset) // self.period) + 1)
+        else:
+            oldest = 0
+        if limit is not None:
+            oldest = max(oldest, newest - limit + 1)
+        posts = []
+        for k in range(newest, oldest - 1, -1):
+            post_id = k * self.accounts + account + 1
+            fetched_at.setdefault(post_id, now)
+            posts.append((post_id, offset + k * self.period, _post_text(post_id)))
+        return posts
+
+class FakeTwitter:
+    def __init__(self, feed, usernames):
+        self.feed = feed
+        self.ids = {username.lower(): i for i, username in usernames.items()}
+
+    def get_users(self, usernames):
+        return types.SimpleNamespace(data=[types.SimpleNamespace(username=username, id=self.ids[username.lower()])
+                                           for username in usernames])
+
+    def get_users_tweets(self, user_id, max_results=5, since_id=None, start_time=None, pagination_token=None, tweet_fields=None):
+        after_time = start_time.timestamp() if start_time else None
+        posts = self.feed.posts(int(user_id), after_id=since_id, after_time=after_time)
+        offset = int(pagination_token or 0)
+        meta = {'next_token': str(offset + max_results)} if len(posts) > offset + max_results else {}
+        return types.SimpleNamespace(meta=meta, data=[
+            types.SimpleNamespace(id=post_id, text=text, created_at=_utc(created))
+            for post_id, created, text in posts[offset:offset + max_results]
+        ] or None)
+
+class FakeTruth:
+    def __init__(self, feed, usernames):
+        self.feed = feed
+        self.ids = {username: i for i, username in usernames.items()}
+        self.auth_id = "offline"
+
+    def lookup(self, user_handle):
+        return {"id": str(self.ids[user_handle]), "username": user_handle}
+
+    def _get(self, url, params=None):
+        account = int(url.split("/")[3])
+        posts = self.feed.posts(account, after_id=params.get("since_id"), limit=20)
+        if "max_id" in params:
+            posts = [post for post in posts if post[0] < int(params["max_id"])]
+        return [{"id": str(post_id), "content": text, "created_at": _utc(created).isoformat()}
+                for post_id, created, text in posts]
+
+class FakeBluesky:
+    def __init__(self, feed, usernames):
+        self.feed = feed
+        self.dids = {username: f"did:plc:offline{i}" for i, username in usernames.items()}
+        self.ids = {f"did:plc:offline{i}": i for i in usernames}
+
+    async def resolve_handle(self, handle):
+        return types.SimpleNamespace(did=self.dids[handle])
+
+    async def get_author_feed(self, actor, cursor=None, limit=50):
+        if cursor:
+            posts = [post for post in self.feed.posts(self.ids[actor]) if post[0] < int(cursor)][:limit]
+        else:
+            posts = self.feed.posts(self.ids[actor], limit=limit)
+        return types.SimpleNamespace(cursor=str(posts[-1][0]) if len(posts) == limit else None, feed=[
+            types.SimpleNamespace(reason=None, post=types.SimpleNamespace(
+                uri=f"at://{actor}/app.bsky.feed.post/{post_id}",
+                record=types.SimpleNamespace(created_at=_utc(created).isoformat(), text=text)
+            ))
+            for post_id, created, text in posts
+        ])
+
+class FakeOpenAI:
+    """Answers like the real model would, after ``latency`` seconds, failing ``error_rate`` of requests."""
+
+    def __init__(self, latency, error_rate):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.chat = types.SimpleNamespace(completions=self)
+
+    async def create(self, model, messages, temperature=None, response_format=None):
+        counters["openai_requests"] += 1
+        await asyncio.sleep(random.uniform(0.5, 1.5) * self.latency)
+        if random.random() < self.error_rate:
+            counters["openai_errors"] += 1
+            raise RuntimeError("simulated OpenAI error")
+        content = messages[-1]["content"]
+        if response_format:
+            content = json.dumps({post_id: _answer(text) for post_id, text in json.loads(content).items()})
+        else:
+            content = _answer(content)
+        usage = types.SimpleNamespace(prompt_tokens=len(messages[-1]["content"]) // 4, completion_tokens=len(content) // 4)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))],
+                                     usage=usage)
+
+    async def close(self):
+        pass
+
+class SinkHandler:
+    async def handle_DATA(self, server, session, envelope):
+        now = time.time()
+        for match in POST_TOKEN.finditer(envelope.content.decode("utf-8", "replace")):
+            delivered_at.setdefault(int(match.group(1)), now)
+        return "250 OK"
+
+def _post_text(post_id):
+    if (post_id * 2654435761) % 100 < MENTION_RATIO * 100:
+        return f"Bitcoin just broke another record, loading up on BTC #p{post_id}"
+    return f"Great turnout at the town hall this morning #p{post_id}"
+
+def _answer(text):
+    return "Positive about Bitcoin; in line with the current rally." if "Bitcoin" in text else "nothing"
+
+def _utc(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+def _percentiles(samples):
+    if len(samples) < 2:
+        return "n/a"
+    cuts = statistics.quantiles(samples, n=100)
+    return f"p50 {cuts[49] * 1000:.0f} ms, p99 {cuts[98] * 1000:.0f} ms"
+
+def _scale_clock(speedup):
+    """Make the poll scheduler's clock, and so every check interval, run ``speedup`` times faster."""
+    start = time.monotonic()
+
+    def monotonic():
+        return start + (time.monotonic() - start) * speedup
+
+    async def wait_for(awaitable, timeout):
+        return await asyncio.wait_for(awaitable, None if timeout is None else timeout / speedup)
+    scheduler.time = types.SimpleNamespace(monotonic=monotonic)
+    scheduler.asyncio = types.SimpleNamespace(**{**vars(asyncio), "wait_for": wait_for})
+
+def _track_analysis():
+    analyze = pipeline.analyze_posts_concurrently
+
+    async def tracked(posts):
+        results = await analyze(posts)
+        now = time.time()
+        for post in posts:
+            match = POST_TOKEN.search(post)
+            if match:
+                analyzed_at.setdefault(int(match.group(1)), now)
+        return results
+    pipeline.analyze_posts_concurrently = tracked
+
+async def run(args, workdir):
+    platforms = args.platforms.split(",")
+    usernames = {platform: {} for platform in platforms}
+    for i in range(args.accounts):
+        platform = platforms[i % len(platforms)]
+        usernames[platform][i] = f"{platform}{i}"
+
+    config = {
+        "twitter": {"check_interval": 1, "rate_limit": {"requests": 10 ** 9, "window": 1}},
+        "truth": {"check_interval": 1, "rate_limit": {"requests": 10 ** 9, "window": 1}},
+        "bluesky": {"check_interval": 1, "rate_limit": {"requests": 10 ** 9, "window": 1}},
+        "openai": {"api_key": "offline", "max_concurrency": args.gpt_concurrency, "batch_size": args.batch_size,
+                   "cache": {"enabled": False}},
+        "email": {
+            "from_email": "bench@localhost", "to_email": ["sink@localhost"], "subject": "bench",
+            "postal": {"enabled": False},
+            "smtp": {"enabled": True, "host": HOST, "port": PORT, "use_tls": False, "username": "bench", "password": "bench"},
+            "outbox": {"path": f"{workdir}/outbox.db", "base_delay": 0.5},
+        },
+        "storage": {"path": f"{workdir}/bench.db"},
+        "logging": {"directory": f"{workdir}/logs", "console": False},
+        "watch_accounts": [{"platform": platform, "username": username}
+                           for platform in platforms for username in usernames[platform].values()],
+    }
+    configure_logging(config)
+    setup_store(config)
+    gpt.setup_client(config)
+    gpt._client = FakeOpenAI(args.gpt_latency, args.gpt_error_rate)
+    _track_analysis()
+    mail.start_outbox(config)
+    pipeline.start_pipeline(config)
+
+    feed = SyntheticFeed(args.accounts, args.posts_per_hour * args.speedup / 3600)
+    watchers = {
+        "twitter": lambda: twitter.watch_tweets(FakeTwitter(feed, usernames["twitter"]), config),
+        "truth": lambda: truth.watch_truths(FakeTruth(feed, usernames["truth"]), config),
+        "bluesky": lambda: bluesky.watch_bluesky(FakeBluesky(feed, usernames["bluesky"]), config),
+    }
+    _scale_clock(args.speedup)
+
+    start = time.time()
+    tasks = [asyncio.create_task(watchers[platform]()) for platform in platforms]
+    await asyncio.sleep(args.duration)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await pipeline.stop_pipeline()
+    outbox = mail.get_outbox(config)
+    deadline = time.time() + 60
+    while outbox.pending() and time.time() < deadline:
+        await asyncio.sleep(0.1)
+    elapsed = time.time() - start
+    await mail.stop_outbox()
+    mail.close_smtp_pool()
+    await gpt.close_client()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--posts-per-hour", type=int, default=10000, help="across all accounts, in simulated time")
+    parser.add_argument("--speedup", type=float, default=360, help="simulated seconds per real second")
+    parser.add_argument("--duration", type=float, default=10, help="real seconds to generate load for")
+    parser.add_argument("--platforms", default="twitter,truth,bluesky")
+    parser.add_argument("--gpt-latency", type=float, default=0.05, help="mean fake OpenAI latency in seconds")
+    parser.add_argument("--gpt-error-rate", type=float, default=0.01)
+    parser.add_argument("--gpt-concurrency", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.getLogger("mail.log").setLevel(logging.WARNING)  # aiosmtpd logs every SMTP command
+    warnings.filterwarnings("ignore", message="Session.login_data")
+    controller = Controller(SinkHandler(), hostname=HOST, port=PORT, auth_require_tls=False,
+                            authenticator=lambda *_: AuthResult(success=True))
+    controller.start()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            elapsed = asyncio.run(run(args, workdir))
+            shutdown_logging()
+    finally:
+        controller.stop()
+
+    analysis_latency = [analyzed_at[i] - fetched_at[i] for i in analyzed_at if i in fetched_at]
+    delivery_latency = [delivered_at[i] - fetched_at[i] for i in delivered_at if i in fetched_at]
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    print(f"load: {args.accounts} accounts, {args.posts_per_hour} posts/h simulated at x{args.speedup:g} "
+          f"({args.posts_per_hour * args.speedup / 3600:.0f} posts/s) for {args.duration:g}s")
+    new_posts = sum(value for *_, value in metrics.posts_fetched.samples())
+    print(f"new posts {new_posts}, analyzed {len(analyzed_at)}, delivered {len(delivered_at)} "
+          f"in {elapsed:.1f}s -> {len(analyzed_at) / elapsed:.0f} posts/s")
+    lost = new_posts - len(analyzed_at)
+    if lost > 0:
+        # Posts are only counted once queued, and shutdown drains the queue, so none should go missing
+        print(f"LOST: {lost} queued posts were never analyzed")
+    print(f"openai: {counters['openai_requests']} requests, {counters['openai_errors']} errors")
+    print(f"fetch -> analyzed:  {_percentiles(analysis_latency)}")
+    print(f"fetch -> delivered: {_percentiles(delivery_latency)}")
+    print(f"peak RSS: {peak_rss:.0f} MiB")
+    if lost > 0:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
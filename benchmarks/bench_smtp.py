@@ -0,0 +1,63 @@
+"""Benchmark: SMTP throughput with a fresh connection per message vs. the session pool.
+
+Starts a local aiosmtpd server as a stand-in for the real mail server and
+sends the same messages both ways. Each new session pays a simulated
+handshake delay (``HANDSHAKE_DELAY``) in place of the TLS negotiation and
+login a real server needs. Requires ``pip install aiosmtpd``.
+Run with ``python benchmarks/bench_smtp.py``.
+"""
+import logging
+import smtplib
+import time
+from aiosmtpd.controller import Controller
+from xcryptowatch.mail import SMTPPool, _create_smtp_message
+
+MESSAGES = 200
+HANDSHAKE_DELAY = 0.02  # seconds; roughly a STARTTLS + AUTH round trip to a nearby server
+HOST, PORT = "127.0.0.1", 8025
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        time.sleep(HANDSHAKE_DELAY)  # Block like a slow handshake would
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+def per_message(smtp_config, msgs):
+    """The original behaviour: connect, send and disconnect for every message."""
+    for msg in msgs:
+        with smtplib.SMTP(smtp_config['host'], smtp_config['port']) as server:
+            server.send_message(msg)
+
+def pooled(smtp_config, msgs):
+    pool = SMTPPool(smtp_config)
+    pool.send_messages(msgs)
+    pool.close()
+
+def main():
+    logging.getLogger("mail.log").setLevel(logging.WARNING)  # aiosmtpd logs every SMTP command
+    handler = CountingHandler()
+    controller = Controller(handler, hostname=HOST, port=PORT)
+    controller.start()
+    smtp_config = {'host': HOST, 'port': PORT, 'use_tls': False, 'username': '', 'password': ''}
+    config = {'email': {'from_email': 'bench@localhost', 'to_email': ['sink@localhost']}}
+    msgs = [_create_smtp_message(config, "bench", f"analysis {i}") for i in range(MESSAGES)]
+    try:
+        for name, send in [("per-message", per_message), ("pooled", pooled)]:
+            before = handler.received
+            start = time.perf_counter()
+            send(smtp_config, msgs)
+            elapsed = time.perf_counter() - start
+            assert handler.received - before == MESSAGES
+            print(f"{name:>12}: {MESSAGES} messages in {elapsed:.2f}s ({MESSAGES / elapsed:.0f} msg/s)")
+    finally:
+        controller.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark: startup cost, as import time and preflight wall time.
+
+1. Imports ``xcryptowatch.core`` in a fresh interpreter ``RUNS`` times and
+   reports the median. It also checks that no platform SDK was imported,
+   because SDKs should only load once their platform is enabled.
+2. Runs the startup checks against fake clients whose probes each take
+   ``PROBE_DELAY`` seconds, and compares the result with running them one
+   after another.
+
+Exits non-zero if an SDK is imported eagerly or the median import time is
+over ``--max-import`` seconds, so it can be used as a regression check.
+Run with ``python benchmarks/bench_startup.py``.
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 5
+PROBE_DELAY = 0.5  # seconds; a typical authenticated round trip to a remote API
+SDKS = ["tweepy", "truthbrush", "postalsend", "openai", "atproto", "websockets"]
+
+IMPORT_PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import xcryptowatch.core\n"
+    "print(time.perf_counter() - start)\n"
+    f"print(','.join(m for m in {SDKS!r} if m in sys.modules))\n"
+)
+
+def import_time():
+    """Return the median import time and the SDKs the import pulled in."""
+    times = []
+    loaded = set()
+    for _ in range(RUNS):
+        output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], capture_output=True, text=True, check=True).stdout
+        elapsed, modules = output.split("\n")[:2]
+        times.append(float(elapsed))
+        loaded.update(filter(None, modules.split(",")))
+    return statistics.median(times), sorted(loaded)
+
+class FakeClient:
+    def trending(self):
+        time.sleep(PROBE_DELAY)
+
+    async def login(self, username, password):
+        await asyncio.sleep(PROBE_DELAY)
+
+async def fake_check_api_key():
+    await asyncio.sleep(PROBE_DELAY)
+
+def preflight_time(preflight):
+    import xcryptowatch.core as core
+    core._setup_truth = lambda config: FakeClient()
+    core._setup_bluesky = lambda config: FakeClient()
+    core._setup_openai = lambda config: None
+    core.check_api_key = fake_check_api_key
+    config = {
+        'twitter': {key: '' for key in ['bearer_token', 'consumer_key', 'consumer_secret', 'access_token', 'access_token_secret']},
+        'truth': {'username': 'bench', 'password': 'bench'},
+        'bluesky': {'username': 'bench', 'password': 'bench'},
+        'email': {'postal': {'enabled': False}, 'from_email': '', 'to_email': []},
+    }
+    start = time.perf_counter()
+    asyncio.run(core._setup_api(config, preflight))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-import", type=float, default=1.0, help="fail if the median import takes longer (seconds)")
+    args = parser.parse_args()
+
+    median, loaded = import_time()
+    print(f"import xcryptowatch.core: {median * 1000:.0f} ms median of {RUNS} runs")
+    print(f"SDKs loaded at import: {', '.join(loaded) or 'none'}")
+
+    logging.disable(logging.CRITICAL)  # The setup path logs every step
+    print(f"preflight, 3 probes of {PROBE_DELAY}s: {preflight_time(True):.2f}s concurrent vs {3 * PROBE_DELAY:.2f}s sequential")
+    print(f"--no-preflight (Bluesky login only): {preflight_time(False):.2f}s")
+
+    if loaded or median > args.max_import:
+        print("FAIL: startup regressed", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,7 @@ setup(
         "openai",
         "truthbrush",
         "atproto",
+        "websockets",
     ],
     classifiers=[
         "Programming Language :: Python :: 3",
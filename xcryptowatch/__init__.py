@@ -1,4 +1,5 @@
+__version__ = "0.1.1"
+
 from .core import main
 
-__version__ = "0.1.1"
-__all__ = ["main"] 
\ No newline at end of file
+__all__ = ["main"]
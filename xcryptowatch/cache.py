@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import html
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from xcryptowatch.log import gpt_logger as logger
+
+__default_max_entries__ = 4096
+__default_ttl__ = 24 * 60 * 60  # seconds
+
+_tag_pattern = re.compile(r"<[^>]+>")
+_retweet_pattern = re.compile(r"^RT @\w+:\s*")
+_whitespace_pattern = re.compile(r"\s+")
+
+def normalize_text(text):
+    """Normalize post text so retweets and cross-posts of one statement hash the same."""
+    text = html.unescape(_tag_pattern.sub(" ", str(text)))
+    text = _retweet_pattern.sub("", text.strip())
+    return _whitespace_pattern.sub(" ", text).strip()
+
+def cache_key(text, model, prompt_version):
+    """Build the cache key for a post: normalized-text hash plus model and prompt version."""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model}:{prompt_version}:{digest}"
+
+class AnalysisCache:
+    """Two-tier cache for GPT answers: an in-memory LRU and an optional SQLite file.
+
+    Both tiers expire entries after ``ttl`` seconds. Concurrent lookups of the
+    same key while it is being computed share one computation.
+    """
+
+    def __init__(self, max_entries=__default_max_entries__, ttl=__default_ttl__, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "collapsed": 0}
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._inflight = {}             # key -> asyncio.Future
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path)
+            self._db.execute("CREATE TABLE IF NOT EXISTS analyses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._db.execute("DELETE FROM analyses WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+            logger.info(f"Using on-disk analysis cache at {path}")
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            del self._entries[key]
+
+        if self._db is not None:
+            row = self._db.execute("SELECT value, expires_at FROM analyses WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+            if row:
+                self._remember(key, row[0], row[1])
+                self.stats["disk_hits"] += 1
+                return row[0]
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key, value):
+        """Store a value in both tiers."""
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        if self._db is not None:
+            self._db.execute("INSERT OR REPLACE INTO analyses (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+            self._db.commit()
+
+    async def get_or_compute(self, key, compute):
+        """Return the cached value for key, awaiting compute() on a miss.
+
+        If the key is already being computed, wait for that result instead of
+        starting a second computation. None results are not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["collapsed"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The computation we joined was cancelled, not us: run it ourselves
+                return await self.get_or_compute(key, compute)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved so an unawaited failure is not reported
+            raise
+        else:
+            future.set_result(value)
+            if value is not None:
+                self.put(key, value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    def get_stats(self):
+        """Return hit/miss counters plus the current in-memory size."""
+        stats = dict(self.stats)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["entries"] = len(self._entries)
+        stats["hit_ratio"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        """Close the on-disk tier."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -22,7 +22,30 @@ config_schema = {
                 "consumer_secret": {"type": "string"},
                 "access_token": {"type": "string"},
                 "access_token_secret": {"type": "string"},
-                "check_interval": {"type": "integer", "minimum": 1}
+                "check_interval": {"type": "integer", "minimum": 1},
+                "user_id_ttl": {"type": "integer", "minimum": 1},
+                "ingest_mode": {"type": "string", "enum": ["accounts", "list", "search"]},
+                "list_name": {"type": "string"},
+                "max_pages": {"type": "integer", "minimum": 1},
+                "search_query_length": {"type": "integer", "minimum": 32},
+                "max_workers": {"type": "integer", "minimum": 1},
+                "adaptive": {
+                    "type": "object",
+                    "properties": {
+                        "enabled": {"type": "boolean"},
+                        "min_interval": {"type": "number", "exclusiveMinimum": 0},
+                        "max_interval": {"type": "number", "exclusiveMinimum": 0},
+                        "budget": {"type": "number", "exclusiveMinimum": 0}
+                    },
+                },
+                "rate_limit": {
+                    "type": "object",
+                    "properties": {
+                        "requests": {"type": "integer", "minimum": 1},
+                        "window": {"type": "number", "exclusiveMinimum": 0}
+                    },
+                    "required": ["requests", "window"],
+                }
             },
             "required": ["bearer_token", "consumer_key", "consumer_secret", "access_token", "access_token_secret", "check_interval"],
         },
@@ -31,7 +54,27 @@ config_schema = {
             "properties": {
                 "username": {"type": "string"},
                 "password": {"type": "string"},
-                "check_interval": {"type": "integer", "minimum": 1}
+                "check_interval": {"type": "integer", "minimum": 1},
+                "account_id_ttl": {"type": "number", "minimum": 0},
+                "max_pages": {"type": "integer", "minimum": 1},
+                "max_workers": {"type": "integer", "minimum": 1},
+                "adaptive": {
+                    "type": "object",
+                    "properties": {
+                        "enabled": {"type": "boolean"},
+                        "min_interval": {"type": "number", "exclusiveMinimum": 0},
+                        "max_interval": {"type": "number", "exclusiveMinimum": 0},
+                        "budget": {"type": "number", "exclusiveMinimum": 0}
+                    },
+                },
+                "rate_limit": {
+                    "type": "object",
+                    "properties": {
+                        "requests": {"type": "integer", "minimum": 1},
+                        "window": {"type": "number", "exclusiveMinimum": 0}
+                    },
+                    "required": ["requests", "window"],
+                }
             },
             "required": ["username", "password", "check_interval"],
         },
@@ -40,7 +83,32 @@ config_schema = {
             "properties": {
                 "username": {"type": "string"},
                 "password": {"type": "string"},
-                "check_interval": {"type": "integer", "minimum": 1}
+                "check_interval": {"type": "integer", "minimum": 1},
+                "ingest_mode": {"type": "string", "enum": ["accounts", "timeline", "stream"]},
+                "list_uri": {"type": "string"},
+                "jetstream_url": {"type": "string"},
+                "replay_file": {"type": "string"},
+                "stream_flush_seconds": {"type": "number", "minimum": 0},
+                "did_ttl": {"type": "integer", "minimum": 1},
+                "max_pages": {"type": "integer", "minimum": 1},
+                "max_workers": {"type": "integer", "minimum": 1},
+                "adaptive": {
+                    "type": "object",
+                    "properties": {
+                        "enabled": {"type": "boolean"},
+                        "min_interval": {"type": "number", "exclusiveMinimum": 0},
+                        "max_interval": {"type": "number", "exclusiveMinimum": 0},
+                        "budget": {"type": "number", "exclusiveMinimum": 0}
+                    },
+                },
+                "rate_limit": {
+                    "type": "object",
+                    "properties": {
+                        "requests": {"type": "integer", "minimum": 1},
+                        "window": {"type": "number", "exclusiveMinimum": 0}
+                    },
+                    "required": ["requests", "window"],
+                }
             },
             "required": ["username", "password", "check_interval"],
         },
@@ -48,6 +116,26 @@ config_schema = {
             "type": "object",
             "properties": {
                 "api_key": {"type": "string"},
+                "max_concurrency": {"type": "integer", "minimum": 1},
+                "timeout": {"type": "number", "exclusiveMinimum": 0},
+                "batch_size": {"type": "integer", "minimum": 1},
+                "prefilter": {
+                    "type": "object",
+                    "properties": {
+                        "enabled": {"type": "boolean"},
+                        "keywords": {"type": "array", "items": {"type": "string"}},
+                        "tickers": {"type": "array", "items": {"type": "string"}}
+                    },
+                },
+                "cache": {
+                    "type": "object",
+                    "properties": {
+                        "enabled": {"type": "boolean"},
+                        "max_entries": {"type": "integer", "minimum": 1},
+                        "ttl": {"type": "integer", "minimum": 1},
+                        "path": {"type": "string"}
+                    },
+                }
             },
             "required": ["api_key"],
         },
@@ -63,9 +151,50 @@ config_schema = {
                         "enabled": {"type": "boolean"},
                         "server": {"type": "string"},
                         "api_key": {"type": "string"},
+                        "timeout": {"type": "number", "exclusiveMinimum": 0}
                     },
                     "required": ["enabled"],
                 },
+                "webhook": {
+                    "type": "object",
+                    "properties": {
+                        "enabled": {"type": "boolean"},
+                        "url": {"type": "string"},
+                        "headers": {"type": "object", "additionalProperties": {"type": "string"}},
+                        "timeout": {"type": "number", "exclusiveMinimum": 0}
+                    },
+                    "required": ["enabled"],
+                },
+                "file": {
+                    "type": "object",
+                    "properties": {
+                        "enabled": {"type": "boolean"},
+                        "path": {"type": "string"},
+                        "timeout": {"type": "number", "exclusiveMinimum": 0}
+                    },
+                    "required": ["enabled"],
+                },
+                "outbox": {
+                    "type": "object",
+                    "properties": {
+                        "enabled": {"type": "boolean"},
+                        "path": {"type": "string"},
+                        "concurrency": {"type": "integer", "minimum": 1},
+                        "batch_size": {"type": "integer", "minimum": 1},
+                        "max_attempts": {"type": "integer", "minimum": 1},
+                        "base_delay": {"type": "number", "minimum": 0},
+                        "max_delay": {"type": "number", "minimum": 0}
+                    },
+                },
+                "digest": {
+                    "type": "object",
+                    "properties": {
+                        "enabled": {"type": "boolean"},
+                        "window": {"type": "number", "exclusiveMinimum": 0},
+                        "max_batch": {"type": "integer", "minimum": 1},
+                        "priority_keywords": {"type": "array", "items": {"type": "string"}}
+                    },
+                },
                 "smtp": {
                     "type": "object",
                     "properties": {
@@ -74,13 +203,69 @@ config_schema = {
                         "port": {"type": "integer"},
                         "username": {"type": "string"},
                         "password": {"type": "string"},
-                        "use_tls": {"type": "boolean"}
+                        "use_tls": {"type": "boolean"},
+                        "pool_size": {"type": "integer", "minimum": 1},
+                        "keepalive": {"type": "number", "minimum": 0},
+                        "socket_timeout": {"type": "number", "exclusiveMinimum": 0},
+                        "timeout": {"type": "number", "exclusiveMinimum": 0}
                     },
                     "required": ["enabled"],
                 }
             },
             "required": ["from_email", "to_email"],
         },
+        "pipeline": {
+            "type": "object",
+            "properties": {
+                "analysis_workers": {"type": "integer", "minimum": 1},
+                "notify_workers": {"type": "integer", "minimum": 1},
+                "queue_size": {"type": "integer", "minimum": 1},
+                "batch_size": {"type": "integer", "minimum": 1}
+            },
+        },
+        "logging": {
+            "type": "object",
+            "properties": {
+                "directory": {"type": "string"},
+                "format": {"type": "string", "enum": ["text", "json"]},
+                "console": {"type": "boolean"},
+                "levels": {
+                    "type": "object",
+                    "propertyNames": {"enum": ["main", "twitter", "truth", "bluesky", "gpt", "postal"]},
+                    "additionalProperties": {"type": "string", "enum": ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL",
+                                                                         "debug", "info", "warning", "error", "critical"]}
+                },
+                "rotation": {
+                    "type": "object",
+                    "properties": {
+                        "max_bytes": {"type": "integer", "minimum": 0},
+                        "when": {"type": "string"},
+                        "backup_count": {"type": "integer", "minimum": 0}
+                    },
+                },
+            },
+        },
+        "metrics": {
+            "type": "object",
+            "properties": {
+                "enabled": {"type": "boolean"},
+                "host": {"type": "string"},
+                "port": {"type": "integer", "minimum": 0, "maximum": 65535}
+            },
+        },
+        "scheduler": {
+            "type": "object",
+            "properties": {
+                "jitter": {"type": "number", "minimum": 0, "maximum": 0.5}
+            },
+        },
+        "storage": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string"},
+                "seen_per_account": {"type": "integer", "minimum": 1}
+            },
+        },
         "watch_accounts": {
             "type": "array",
             "items": {
@@ -136,6 +321,18 @@ def smtp_enabled(config):
         config['email']['to_email']
     )
 
+def webhook_enabled(config):
+    return bool(
+        config['email'].get('webhook', {}).get('enabled', False) and
+        config['email']['webhook'].get('url')
+    )
+
+def file_sink_enabled(config):
+    return bool(
+        config['email'].get('file', {}).get('enabled', False) and
+        config['email']['file'].get('path')
+    )
+
 def load_config():
     config_path = _get_config_path()
     if not os.path.exists(config_path):
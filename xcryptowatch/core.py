@@ -1,22 +1,39 @@
+import argparse
 import asyncio
-import tweepy
-from truthbrush import Api as TruthClient
-import postalsend
-import openai
+import importlib
+import signal
 from xcryptowatch.config_json import create_config, _save_config, load_config, add_new_account, add_new_recipient, twitter_enabled, truth_enabled, postal_enabled, bluesky_enabled
-from xcryptowatch.social.twitter import watch_tweets
-from xcryptowatch.social.truth import watch_truths
-from xcryptowatch.social.bluesky import watch_bluesky
-from xcryptowatch.log import main_logger as logger
+from xcryptowatch.gpt import setup_client as setup_gpt_client, check_api_key, close_client as close_gpt_client
+from xcryptowatch.store import setup_store, close_store
+from xcryptowatch.pipeline import start_pipeline, stop_pipeline
+from xcryptowatch.mail import close_smtp_pool, start_outbox, stop_outbox
+from xcryptowatch.metrics import start_metrics_server, stop_metrics_server
+from xcryptowatch.log import main_logger as logger, configure_logging
 from xcryptowatch import __version__
 
-async def main():
+# Platform watchers are imported on first use so disabled platforms never load their SDKs
+__watchers__ = {
+    "twitter": ("xcryptowatch.social.twitter", "watch_tweets"),
+    "truth": ("xcryptowatch.social.truth", "watch_truths"),
+    "bluesky": ("xcryptowatch.social.bluesky", "watch_bluesky"),
+}
+
+# Config sections only read at startup; a SIGHUP reload warns when one of them changed
+__startup_only__ = ("openai", "pipeline", "metrics", "scheduler", "storage", "email.postal", "email.outbox", "email.digest")
+
+async def main(preflight=True):
+    configure_logging()
     logger.info(f"xcryptowatch version: {__version__}")
     logger.info(f"For more information, visit https://github.com/steelproxy/xcryptowatch")
     logger.info(f"Starting xcryptowatch...")
 
     config = _setup_config()
-    twitter_client, truth_client, bluesky_client = _setup_api(config)
+    configure_logging(config)
+    setup_store(config)
+    twitter_client, truth_client, bluesky_client = await _setup_api(config, preflight)
+    start_outbox(config)
+    start_pipeline(config)
+    await start_metrics_server(config)
     logger.info("Initialized successfully!")
 
     twitter_task = None
@@ -43,7 +60,7 @@ async def main():
                     if twitter_task and not twitter_task.done():
                         print("Twitter watch is already running!")
                     else:
-                        twitter_task = asyncio.create_task(watch_tweets(twitter_client, config))
+                        twitter_task = asyncio.create_task(_get_watcher("twitter")(twitter_client, config))
                         print("Started watching tweets")
                 case "2":
                     if twitter_task and not twitter_task.done():
@@ -55,7 +72,7 @@ async def main():
                     if truth_task and not truth_task.done():
                         print("Truth watch is already running!")
                     else:
-                        truth_task = asyncio.create_task(watch_truths(truth_client, config))
+                        truth_task = asyncio.create_task(_get_watcher("truth")(truth_client, config))
                         print("Started watching truths")
                 case "4":
                     if truth_task and not truth_task.done():
@@ -67,7 +84,7 @@ async def main():
                     if bluesky_task and not bluesky_task.done():
                         print("Bluesky watch is already running!")
                     else:
-                        bluesky_task = asyncio.create_task(watch_bluesky(bluesky_client, config))
+                        bluesky_task = asyncio.create_task(_get_watcher("bluesky")(bluesky_client, config))
                         print("Started watching bluesky")
                 case "6":
                     if bluesky_task and not bluesky_task.done():
@@ -90,8 +107,111 @@ async def main():
             if bluesky_task and not bluesky_task.done():
                 bluesky_task.cancel()
             await asyncio.sleep(0)  # Let the tasks cancel
+            await _drain()
             exit(0)
 
+async def run_daemon(platforms, preflight=True):
+    """Run the given watchers without the interactive menu, e.g. under systemd.
+
+    SIGTERM and SIGINT stop the watchers and drain queued analyses and
+    notifications before exiting; SIGHUP reloads config.json in place.
+    Nothing here reads stdin, so a missing or invalid config is fatal.
+    """
+    configure_logging()
+    logger.info(f"xcryptowatch version: {__version__}")
+    logger.info(f"Starting xcryptowatch daemon for: {', '.join(platforms)}...")
+
+    try:
+        config = load_config()
+    except Exception as e:
+        logger.error(f"Unable to load configuration file: {e}! Quitting...")
+        exit(1)
+    if not config:
+        logger.error("Configuration file is invalid! Quitting...")
+        exit(1)
+
+    configure_logging(config)
+    setup_store(config)
+    clients = dict(zip(("twitter", "truth", "bluesky"), await _setup_api(config, preflight, platforms)))
+    start_outbox(config)
+    start_pipeline(config)
+    await start_metrics_server(config)
+
+    tasks = []
+    for platform in platforms:
+        if clients[platform] is None:
+            logger.warning(f"{platform} is not configured! Not watching it.")
+            continue
+        tasks.append(asyncio.create_task(_get_watcher(platform)(clients[platform], config), name=platform))
+    if not tasks:
+        logger.error("None of the requested platforms are configured! Quitting...")
+        await _drain()
+        exit(1)
+    logger.info("Initialized successfully!")
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    if hasattr(signal, "SIGHUP"):
+        loop.add_signal_handler(signal.SIGHUP, _reload_config, config)
+
+    stopper = asyncio.create_task(stop.wait())
+    await asyncio.wait(tasks + [stopper], return_when=asyncio.FIRST_COMPLETED)
+    for task in tasks:
+        if task.done() and not task.cancelled() and task.exception():
+            logger.error(f"{task.get_name()} watcher crashed: {task.exception()}")
+
+    logger.info("Shutting down, draining queued analyses and notifications...")
+    for task in tasks + [stopper]:
+        task.cancel()
+    await asyncio.gather(*tasks, stopper, return_exceptions=True)
+    await _drain()
+    logger.info("Shut down cleanly.")
+
+def _reload_config(config):
+    """Replace the running configuration in place so watchers pick it up on their next cycle.
+
+    Without a restart this applies watch accounts, each platform's
+    check_interval, max_pages, adaptive, rate_limit, max_workers and
+    ingest mode (except switching Bluesky to or from stream), recipients,
+    subject, SMTP and webhook settings, and logging. Credentials, enabled
+    platforms and the __startup_only__ sections are only read at startup.
+    """
+    logger.info("Reloading configuration...")
+    try:
+        new_config = load_config()
+    except Exception as e:
+        logger.error(f"Unable to reload configuration file: {e}! Keeping the current one.")
+        return
+    if not new_config:
+        logger.error("Reloaded configuration is invalid! Keeping the current one.")
+        return
+    changed = [section for section in __startup_only__ if _config_section(config, section) != _config_section(new_config, section)]
+    if changed:
+        logger.warning(f"Changes to {', '.join(changed)} take effect after a restart.")
+    config.clear()
+    config.update(new_config)
+    configure_logging(config)
+    logger.info("Configuration reloaded.")
+
+def _config_section(config, section):
+    for key in section.split("."):
+        config = config.get(key, {}) if isinstance(config, dict) else {}
+    return config
+
+def _get_watcher(platform):
+    module, name = __watchers__[platform]
+    return getattr(importlib.import_module(module), name)
+
+async def _drain():
+    await stop_pipeline()   # Finish analyses and notifications already queued
+    await stop_metrics_server()
+    await stop_outbox()
+    close_smtp_pool()
+    await close_gpt_client()
+    close_store()
+
 def _configure(config):
     while True:
         print(f"1: Twitter Bearer Token: {config['twitter']['bearer_token']}")
@@ -211,9 +331,23 @@ def _setup_config():
         _save_config(config)
     return config
 
-def _setup_api(config):
+async def _setup_api(config, preflight=True, platforms=tuple(__watchers__)):
+    """Create the enabled clients, then run their network checks concurrently.
+
+    Building a client makes no network calls. The checks (Truth trending,
+    an OpenAI model listing and the Bluesky login, which the client needs
+    anyway) then run side by side, so startup waits for the slowest one
+    rather than the sum. With preflight off only the Bluesky login is made.
+    Platforms not in ``platforms`` get no client, so their SDKs are never
+    imported and their credentials are never checked.
+    """
+    checks = {}
+
     # Twitter
-    if twitter_enabled(config):
+    if "twitter" not in platforms:
+        logger.debug("Twitter is not selected! Skipping Twitter client initialization.")
+        twitter_client = None
+    elif twitter_enabled(config):
         logger.info("Initializing Twitter client...")
         twitter_client = _setup_twitter(config)
     else:
@@ -221,9 +355,14 @@ def _setup_api(config):
         twitter_client = None
 
     # Truth
-    if truth_enabled(config):
+    if "truth" not in platforms:
+        logger.debug("Truth is not selected! Skipping Truth client initialization.")
+        truth_client = None
+    elif truth_enabled(config):
         logger.info("Initializing Truth client...")
         truth_client = _setup_truth(config)
+        if preflight:
+            checks["Truth"] = asyncio.to_thread(truth_client.trending)  # Test the client with a simple API call
     else:
         logger.warning("Truth is disabled! Skipping Truth client initialization.")
         truth_client = None
@@ -231,6 +370,8 @@ def _setup_api(config):
     # OpenAI
     logger.info("Initializing OpenAI client...")
     _setup_openai(config)
+    if preflight:
+        checks["OpenAI"] = check_api_key()
 
     # Postal
     if postal_enabled(config):
@@ -240,13 +381,29 @@ def _setup_api(config):
         logger.warning("Postal is disabled! Skipping Postal client initialization.")
 
     # Bluesky
-    if bluesky_enabled(config):
+    if "bluesky" not in platforms:
+        logger.debug("Bluesky is not selected! Skipping Bluesky client initialization.")
+        bluesky_client = None
+    elif bluesky_enabled(config):
         logger.info("Initializing Bluesky client...")
         bluesky_client = _setup_bluesky(config)
+        checks["Bluesky"] = bluesky_client.login(config['bluesky']['username'], config['bluesky']['password'])
     else:
         logger.warning("Bluesky is disabled! Skipping Bluesky client initialization.")
         bluesky_client = None
 
+    if not preflight:
+        logger.warning("Preflight checks are disabled! Bad credentials will only show up once watching starts.")
+    results = await asyncio.gather(*checks.values(), return_exceptions=True)
+    failed = False
+    for name, result in zip(checks, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Failed to initialize {name} API client: {result}!")
+            failed = True
+    if failed:
+        logger.error("Quitting...")
+        exit(1)
+
     return twitter_client, truth_client, bluesky_client
 
 def _setup_twitter(config):
@@ -256,6 +413,7 @@ def _setup_twitter(config):
     logger.debug(f"Access Token: {config['twitter']['access_token']}")
     logger.debug(f"Access Token Secret: {config['twitter']['access_token_secret']}")
     try:
+        import tweepy
         twitter_client = tweepy.Client(
             bearer_token=config['twitter']['bearer_token'],
             consumer_key=config['twitter']['consumer_key'],
@@ -272,11 +430,11 @@ def _setup_truth(config):
     logger.debug(f"Username: {config['truth']['username']}")
     logger.debug(f"Password: {config['truth']['password']}")
     try:
+        from truthbrush import Api as TruthClient
         truth_client = TruthClient(
             username=config['truth']['username'],
             password=config['truth']['password']
         )
-        truth_client.trending()  # Test the client with a simple API call
     except Exception as e:
         logger.error(f"Failed to initialize Truth API client: {e}! Quitting...")
         exit(1)
@@ -285,8 +443,7 @@ def _setup_truth(config):
 def _setup_openai(config):
     logger.debug(f"API Key: {config['openai']['api_key']}")
     try:
-        openai.api_key = config['openai']['api_key']
-        openai.models.list()    # Test the client with a simple API call
+        setup_gpt_client(config)
     except Exception as e:
         logger.error(f"Error initializing OpenAI client: {str(e)}!")
         exit(1)
@@ -297,6 +454,7 @@ def _setup_postal(config):
     logger.debug(f"To: {config['email']['to_email']}")
     logger.debug(f"From: {config['email']['from_email']}")
     try:
+        import postalsend
         postalsend.login(config['email']['postal']['server'], config['email']['postal']['api_key'])
         postalsend.push_setup(config['email']['to_email'], config['email']['from_email'])
     except Exception as e:
@@ -306,16 +464,34 @@ def _setup_bluesky(config):
     logger.debug(f"Username: {config['bluesky']['username']}")
     logger.debug(f"Password: {config['bluesky']['password']}")
     try:
-        from atproto import Client
-        bluesky_client = Client()
-        bluesky_client.login(config['bluesky']['username'], config['bluesky']['password'])
+        from atproto import AsyncClient
+        bluesky_client = AsyncClient()
     except Exception as e:
         logger.error(f"Failed to initialize Bluesky API client: {e}! Quitting...")
         exit(1)
     return bluesky_client
 
 def _run_main():
-        asyncio.run(main())
+    parser = argparse.ArgumentParser(prog="xcryptowatch", description="Monitor crypto trends on social media.")
+    subparsers = parser.add_subparsers(dest="command")
+    run_parser = subparsers.add_parser("run", help="run watchers headless, without the interactive menu")
+    parser.add_argument("--no-preflight", dest="preflight", action="store_false",
+                        help="skip the API credential checks at startup")
+    # SUPPRESS keeps the subparser from overwriting a --no-preflight given before "run"
+    run_parser.add_argument("--no-preflight", dest="preflight", action="store_false", default=argparse.SUPPRESS,
+                            help="skip the API credential checks at startup")
+    run_parser.add_argument("--platforms", default=",".join(__watchers__),
+                            help=f"comma-separated platforms to watch (default: {','.join(__watchers__)})")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        platforms = [platform.strip().lower() for platform in args.platforms.split(",") if platform.strip()]
+        unknown = [platform for platform in platforms if platform not in __watchers__]
+        if unknown or not platforms:
+            parser.error(f"unknown platform(s): {', '.join(unknown) or 'none given'}")
+        asyncio.run(run_daemon(platforms, args.preflight))
+    else:
+        asyncio.run(main(args.preflight))
 
 if __name__ == "__main__":
     _run_main()
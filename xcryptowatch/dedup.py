@@ -0,0 +1,42 @@
+from collections import deque
+
+__default_per_account__ = 1000
+
+class BoundedSeenSet:
+    """Bounded record of recently seen post ids with O(1) membership checks.
+
+    Each account gets its own ring buffer, so a chatty account only ever
+    evicts its own history. A single hash set over (account, post id) answers
+    membership without scanning any buffer.
+    """
+
+    def __init__(self, per_account=__default_per_account__):
+        self.per_account = per_account
+        self._rings = {}       # account -> deque of post ids, oldest first
+        self._members = set()  # (account, post id)
+
+    def __contains__(self, item):
+        return item in self._members
+
+    def __len__(self):
+        return len(self._members)
+
+    def add(self, account, post_id):
+        """Record a post id. Returns True if it was new, False if it was already present."""
+        item = (account, post_id)
+        if item in self._members:
+            return False
+
+        ring = self._rings.get(account)
+        if ring is None:
+            ring = self._rings[account] = deque()
+        if len(ring) >= self.per_account:
+            self._members.discard((account, ring.popleft()))
+        ring.append(post_id)
+        self._members.add(item)
+        return True
+
+    def discard_account(self, account):
+        """Forget every post id recorded for an account."""
+        for post_id in self._rings.pop(account, ()):
+            self._members.discard((account, post_id))
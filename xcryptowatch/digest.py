@@ -0,0 +1,92 @@
+import asyncio
+import datetime
+import re
+import xcryptowatch.mail as mail
+from xcryptowatch.log import postal_logger as logger
+
+__default_window__ = 300  # seconds
+__default_max_batch__ = 50
+
+class DigestAggregator:
+    """Coalesce analyses from every platform into one digest email per time window.
+
+    The first analysis after a flush opens a window of ``window`` seconds.
+    Everything added before the window closes goes out as one message, or
+    earlier if ``max_batch`` analyses pile up. An analysis that matches one
+    of ``priority_keywords`` skips the digest and is sent straight away.
+    """
+
+    def __init__(self, config, window=__default_window__, max_batch=__default_max_batch__, priority_keywords=None):
+        self.config = config
+        self.window = window
+        self.max_batch = max_batch
+        self._priority = None
+        if priority_keywords:
+            self._priority = re.compile("|".join(re.escape(keyword) for keyword in priority_keywords), re.IGNORECASE)
+        self._pending = []  # (received_at, platform, analysis)
+        self._timer = None
+        self.stats = {"received": 0, "digests_sent": 0, "priority_sent": 0}
+
+    async def add(self, platform, analysis):
+        """Queue an analysis for the next digest, or send it at once if it is high priority."""
+        self.stats["received"] += 1
+        if self._priority is not None and self._priority.search(analysis):
+            logger.info(f"High-priority {platform} analysis, bypassing digest...")
+            self.stats["priority_sent"] += 1
+            await mail.send_analyses([analysis], self.config, subject=f"[PRIORITY] {_base_subject(self.config)}")
+            return
+
+        self._pending.append((datetime.datetime.now(datetime.timezone.utc), platform, analysis))
+        if len(self._pending) >= self.max_batch:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        """Send everything pending as one digest."""
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        platforms = sorted({platform for _, platform, _ in pending})
+        logger.info(f"Sending digest of {len(pending)} analyses from {', '.join(platforms)}...")
+        try:
+            await mail.send_analyses([_format_digest(pending)], self.config,
+                                     subject=f"{_base_subject(self.config)} digest ({len(pending)} analyses)")
+            self.stats["digests_sent"] += 1
+        except Exception as e:
+            logger.error(f"Error sending digest of {len(pending)} analyses: {e}")
+
+    async def close(self):
+        """Flush whatever is pending, e.g. on shutdown."""
+        await self.flush()
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        await self.flush()
+
+def create_digest(config):
+    """Build an aggregator from email.digest, or return None if digest mode is off."""
+    digest_config = config['email'].get('digest', {})
+    if not digest_config.get('enabled', False):
+        return None
+    return DigestAggregator(
+        config,
+        window=digest_config.get('window', __default_window__),
+        max_batch=digest_config.get('max_batch', __default_max_batch__),
+        priority_keywords=digest_config.get('priority_keywords', [])
+    )
+
+def _base_subject(config):
+    return config['email'].get('subject') or 'XCryptoWatch Analysis'
+
+def _format_digest(pending):
+    start, end = pending[0][0], pending[-1][0]
+    lines = [f"XCryptoWatch digest: {len(pending)} analyses between {start:%Y-%m-%d %H:%M:%S} and {end:%H:%M:%S} UTC.", ""]
+    for i, (received_at, platform, analysis) in enumerate(pending, 1):
+        lines.append(f"{i}. [{platform} @ {received_at:%H:%M:%S}] {analysis}")
+        lines.append("")
+    return "\n".join(lines)
@@ -1,5 +1,10 @@
-import openai
 import asyncio
+import re
+import json
+import hashlib
+import time
+from xcryptowatch import metrics
+from xcryptowatch.cache import AnalysisCache, cache_key
 from xcryptowatch.log import gpt_logger as logger
 
 __chatgpt_role__ = ("You are a helpful assistant that analyzes social media posts to determine if they mention cryptocurrency "
@@ -14,35 +19,323 @@ __chatgpt_role__ = ("You are a helpful assistant that analyzes social media post
                     "- Compare the sentiment to **current cryptocurrency market trends** "
                     "(e.g., price movement, major news, investor sentiment).")
 
+__chatgpt_batch_role__ = (__chatgpt_role__ + " "
+                          "You will receive several posts at once as a JSON object that maps post ids to post text. "
+                          "Apply the rules above to every post independently and respond with a single JSON object "
+                          "that maps every post id to your answer for that post: either the string \"nothing\" or "
+                          "your sentiment summary. Include every post id exactly once and nothing else.")
+
+__gpt_model__ = "gpt-4o"
+# Bumps automatically whenever the analysis prompt changes, invalidating cached answers
+__prompt_version__ = hashlib.sha256(__chatgpt_role__.encode("utf-8")).hexdigest()[:12]
+__default_max_concurrency__ = 10
+__default_timeout__ = 60
+__default_batch_size__ = 1
+
+# Words and phrases that make a post worth sending to GPT. 'doge' is kept on purpose:
+# the local matcher cannot tell Dogecoin from the Department Of Government Efficiency,
+# so those posts are escalated and GPT makes the call.
+__default_prefilter_keywords__ = [
+    "crypto", "cryptos", "cryptocurrency", "cryptocurrencies", "bitcoin", "bitcoins", "ethereum",
+    "ether", "solana", "dogecoin", "doge", "ripple", "cardano", "litecoin", "tether", "binance",
+    "coinbase", "blockchain", "stablecoin", "stablecoins", "altcoin", "altcoins", "memecoin",
+    "memecoins", "defi", "nft", "nfts", "web3", "satoshi", "hodl", "digital asset", "digital assets",
+    "digital currency", "strategic reserve"
+]
+# Tickers match either as a $cashtag (any case) or as a standalone upper-case word.
+__default_prefilter_tickers__ = [
+    "BTC", "ETH", "SOL", "XRP", "DOGE", "ADA", "USDT", "USDC", "BNB", "LTC", "SHIB", "PEPE",
+    "AVAX", "DOT", "LINK", "TRX", "XLM", "HBAR", "SUI", "TRUMP"
+]
+
+# Shared async client state, populated by setup_client()
+_client = None
+_semaphore = None
+_timeout = __default_timeout__
+_batch_size = __default_batch_size__
+
+# Pre-filter state: a callable taking a post and returning True if it should reach GPT
+_prefilter = None
+prefilter_stats = {"checked": 0, "escalated": 0, "filtered": 0}
+
+# Result cache in front of the API, None when disabled
+_cache = None
+
+def setup_client(config):
+    """Create the shared async OpenAI client and concurrency limit from the configuration."""
+    global _client, _semaphore, _timeout, _batch_size, _cache
+    openai_config = config['openai']
+    max_concurrency = openai_config.get('max_concurrency', __default_max_concurrency__)
+    _timeout = openai_config.get('timeout', __default_timeout__)
+    _batch_size = openai_config.get('batch_size', __default_batch_size__)
+    _semaphore = asyncio.Semaphore(max_concurrency)
+    import openai  # Deferred: the SDK is slow to import and only needed once analysis is set up
+    _client = openai.AsyncOpenAI(api_key=openai_config['api_key'])
+    logger.debug(f"Async OpenAI client ready (max in flight: {max_concurrency}, timeout: {_timeout}s, batch size: {_batch_size})")
+
+    prefilter_config = openai_config.get('prefilter', {})
+    if prefilter_config.get('enabled', True):
+        set_prefilter(build_keyword_prefilter(
+            prefilter_config.get('keywords', __default_prefilter_keywords__),
+            prefilter_config.get('tickers', __default_prefilter_tickers__)
+        ))
+    else:
+        set_prefilter(None)
+        logger.warning("GPT pre-filter is disabled! Every post will be sent to OpenAI.")
+
+    cache_config = openai_config.get('cache', {})
+    if _cache is not None:
+        _cache.close()
+    if cache_config.get('enabled', True):
+        _cache = AnalysisCache(
+            max_entries=cache_config.get('max_entries', 4096),
+            ttl=cache_config.get('ttl', 24 * 60 * 60),
+            path=cache_config.get('path')
+        )
+    else:
+        _cache = None
+        logger.warning("GPT result cache is disabled!")
+
+def set_prefilter(prefilter):
+    """Install the pre-classification stage. Pass None to send every post to GPT."""
+    global _prefilter
+    _prefilter = prefilter
+
+def build_keyword_prefilter(keywords, tickers):
+    """Build a pre-filter that matches keywords, tickers and cashtags with a single compiled regex."""
+    pattern = _compile_prefilter_pattern(keywords, tickers)
+    logger.debug(f"Pre-filter compiled with {len(keywords)} keywords and {len(tickers)} tickers.")
+    return lambda post: pattern.search(str(post)) is not None
+
+def get_prefilter_stats():
+    """Return a copy of the pre-filter counters."""
+    return dict(prefilter_stats)
+
+def get_cache_stats():
+    """Return the result cache counters, or None if the cache is disabled."""
+    return _cache.get_stats() if _cache is not None else None
+
+async def check_api_key():
+    """Make a cheap API call (listing models) to confirm the key works. Raises on failure."""
+    client, _ = _get_client()
+    await asyncio.wait_for(client.models.list(), _timeout)
+
+async def close_client():
+    """Close the shared async OpenAI client and the result cache, if they were created."""
+    global _client, _cache
+    if _client is not None:
+        await _client.close()
+        _client = None
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
 async def analyze_post(post):
     """Analyzes a single post asynchronously."""
-    try:
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=_create_gpt_message(post),
-            temperature=0.7
+    compute = lambda: _request_completion(_create_gpt_message(post))
+    if _cache is not None:
+        response_message = await _cache.get_or_compute(_post_cache_key(post), compute)
+    else:
+        response_message = await compute()
+    if response_message is None:
+        return None
+    return _format_result(post, response_message)
+
+async def analyze_posts_batch(posts):
+    """Analyzes several posts in a single request.
+
+    The posts are sent as one JSON object keyed by post id and the answers are
+    read back the same way. Any post whose answer is missing or unreadable is
+    re-analyzed on its own with analyze_post(). If the request itself fails
+    (error, rate limit or timeout), the uncached posts get a None result
+    instead, as re-sending each one would only multiply the failed requests.
+    """
+    if len(posts) == 1:
+        return [await analyze_post(posts[0])]
+
+    post_ids = [str(i) for i in range(len(posts))]
+    answers = {}
+    if _cache is not None:
+        for post_id, post in zip(post_ids, posts):
+            cached = _cache.get(_post_cache_key(post))
+            if cached is not None:
+                answers[post_id] = cached
+
+    uncached = {post_id: post for post_id, post in zip(post_ids, posts) if post_id not in answers}
+    failed = set()
+    if len(uncached) > 1:
+        response_message = await _request_completion(
+            _create_batch_message(uncached),
+            response_format={"type": "json_object"}
         )
+        if response_message is None:
+            logger.error(f"Batch request for {len(uncached)} posts failed, not retrying them one by one.")
+            failed = set(uncached)
+        batch_answers = _parse_batch_response(response_message, list(uncached))
+        if not failed and len(batch_answers) < len(uncached):
+            logger.warning(f"Batch response unusable for {len(uncached) - len(batch_answers)} of {len(uncached)} posts, "
+                           f"falling back to per-post requests.")
+        if _cache is not None:
+            for post_id, answer in batch_answers.items():
+                _cache.put(_post_cache_key(uncached[post_id]), answer)
+        answers.update(batch_answers)
+
+    missing = [i for i, post_id in enumerate(post_ids) if post_id not in answers and post_id not in failed]
+    fallback = await asyncio.gather(*[analyze_post(posts[i]) for i in missing], return_exceptions=True)
+    fallback_results = dict(zip(missing, fallback))
+    fallback_results.update((i, None) for i, post_id in enumerate(post_ids) if post_id in failed)
+
+    return [fallback_results[i] if i in fallback_results else _format_result(post, answers[post_ids[i]])
+            for i, post in enumerate(posts)]
+
+async def analyze_posts_concurrently(posts):
+    """Analyzes multiple posts concurrently using asyncio.gather.
+
+    At most ``max_concurrency`` requests are in flight at once. Cancelling the
+    caller cancels every outstanding request. Posts rejected by the pre-filter
+    are answered with "nothing" without an API call. With ``batch_size`` above
+    one, candidates are grouped into batched requests of that size.
+    """
+    candidates = [i for i, post in enumerate(posts) if _should_escalate(post)]
+    if len(candidates) < len(posts):
+        logger.info(f"Pre-filter skipped {len(posts) - len(candidates)} of {len(posts)} posts "
+                    f"(total filtered: {prefilter_stats['filtered']}/{prefilter_stats['checked']}).")
+
+    # Identical texts in one cycle are analyzed once and share the result
+    duplicates = {}
+    for i in candidates:
+        duplicates.setdefault(_post_cache_key(posts[i]), []).append(i)
+    candidates = [indices[0] for indices in duplicates.values()]
+
+    results = ["nothing"] * len(posts)
+    if _batch_size > 1 and len(candidates) > 1:
+        chunks = [candidates[i:i + _batch_size] for i in range(0, len(candidates), _batch_size)]
+        logger.info(f"Analyzing {len(candidates)} posts in {len(chunks)} batched requests...")
+        tasks = [analyze_posts_batch([posts[i] for i in chunk]) for chunk in chunks]
+        for chunk, chunk_results in zip(chunks, await asyncio.gather(*tasks, return_exceptions=True)):
+            if isinstance(chunk_results, BaseException):
+                chunk_results = [chunk_results] * len(chunk)
+            for i, result in zip(chunk, chunk_results):
+                results[i] = result
+    else:
+        tasks = [analyze_post(posts[i]) for i in candidates]
+        for i, result in zip(candidates, await asyncio.gather(*tasks, return_exceptions=True)):
+            results[i] = result
+
+    for indices in duplicates.values():
+        for i in indices[1:]:
+            results[i] = _reformat_result(results[indices[0]], posts[indices[0]], posts[i])
+    # Only results from the API or cache are counted; pre-filtered posts have their own metric
+    for result in (results[i] for i in candidates):
+        if not result or isinstance(result, BaseException):
+            metrics.gpt_results.inc(result='error')
+        else:
+            metrics.gpt_results.inc(result='nothing' if result == "nothing" else 'mention')
+    if _cache is not None:
+        logger.debug(f"Result cache stats: {_cache.get_stats()}")
+    return results
+
+async def _request_completion(messages, **kwargs):
+    """Send one chat completion request and return the stripped reply text, or None on error."""
+    client, semaphore = _get_client()
+    try:
+        async with semaphore:
+            start = time.monotonic()
+            response = await asyncio.wait_for(
+                client.chat.completions.create(
+                    model=__gpt_model__,
+                    messages=messages,
+                    temperature=0.7,
+                    **kwargs
+                ),
+                timeout=_timeout
+            )
+            metrics.gpt_seconds.observe(time.monotonic() - start)
+    except asyncio.TimeoutError:
+        metrics.gpt_requests.inc(outcome='timeout')
+        logger.error(f"OpenAI request timed out after {_timeout} seconds.")
+        return None
     except Exception as e:
+        metrics.gpt_requests.inc(outcome='error')
         return _handle_openai_error(e)
+    metrics.gpt_requests.inc(outcome='ok')
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        metrics.gpt_tokens.inc(getattr(usage, 'prompt_tokens', 0) or 0, kind='prompt')
+        metrics.gpt_tokens.inc(getattr(usage, 'completion_tokens', 0) or 0, kind='completion')
 
     # Validate API response
     if not hasattr(response, 'choices') or not response.choices:
         logger.error("API response does not contain 'choices'")
         return None
-    if not hasattr(response.choices[0], 'message') or not hasattr(response.choices[0].message, 'content'):
+    if not hasattr(response.choices[0], 'message') or not getattr(response.choices[0].message, 'content', None):
         logger.error("API response does not contain expected content")
         return None
-    
-    response_message = response.choices[0].message.content.strip()
+
+    return response.choices[0].message.content.strip()
+
+def _format_result(post, response_message):
+    """Turn a GPT reply into the result string handed to the notifiers."""
     if response_message == "nothing":
         return response_message
     return f"This post was analyzed and believed to contain relevant information: [{post}]. Thoughts: {response_message}"
 
-async def analyze_posts_concurrently(posts):
-    """Analyzes multiple posts concurrently using asyncio.gather."""
-    tasks = [analyze_post(post) for post in posts]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    return results
+def _reformat_result(result, original_post, post):
+    """Reuse the analysis of an identical post for a duplicate, quoting the duplicate's own text."""
+    if isinstance(result, str) and result != "nothing":
+        return result.replace(f"[{original_post}]", f"[{post}]", 1)
+    return result
+
+def _post_cache_key(post):
+    return cache_key(post, __gpt_model__, __prompt_version__)
+
+def _parse_batch_response(response_message, post_ids):
+    """Read a batched JSON reply into {post_id: answer}; unusable entries are left out."""
+    if response_message is None:
+        return {}
+    try:
+        answers = json.loads(response_message)
+    except json.JSONDecodeError as e:
+        logger.error(f"Unable to parse batch response as JSON: {e}")
+        return {}
+    if not isinstance(answers, dict):
+        logger.error("Batch response is not a JSON object")
+        return {}
+    return {post_id: answers[post_id].strip() for post_id in post_ids
+            if isinstance(answers.get(post_id), str) and answers[post_id].strip()}
+
+def _should_escalate(post):
+    """Run the pre-filter on a post and update the counters."""
+    prefilter_stats["checked"] += 1
+    if _prefilter is None or _prefilter(post):
+        prefilter_stats["escalated"] += 1
+        return True
+    prefilter_stats["filtered"] += 1
+    return False
+
+def _compile_prefilter_pattern(keywords, tickers):
+    """Combine keywords and tickers into one regex; longest alternatives first so phrases win."""
+    def alternation(words):
+        escaped = [r"\s+".join(re.escape(part) for part in word.split()) for word in words if word.strip()]
+        return "|".join(sorted(escaped, key=len, reverse=True)) or r"(?!)"
+
+    keyword_alt = alternation(keywords)
+    ticker_alt = alternation(ticker.upper() for ticker in tickers)
+    return re.compile(
+        rf"(?i:(?<!\w)(?:{keyword_alt})(?!\w))"    # keywords, any case
+        rf"|\$(?i:{ticker_alt})(?!\w)"             # $cashtags, any case
+        rf"|(?<![\w$])(?:{ticker_alt})(?!\w)"      # bare tickers, upper case only
+    )
+
+def _get_client():
+    """Return the shared client and semaphore, creating defaults if setup_client() was never called."""
+    global _client, _semaphore
+    if _client is None:
+        import openai
+        _client = openai.AsyncOpenAI(api_key=openai.api_key)
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(__default_max_concurrency__)
+    return _client, _semaphore
 
 def _create_gpt_message(post):
     """Create the message structure for the GPT API request."""
@@ -51,8 +344,16 @@ def _create_gpt_message(post):
         {"role": "user", "content": f"{post}"}
     ]
 
+def _create_batch_message(posts_by_id):
+    """Create the message structure for a batched GPT API request."""
+    return [
+        {"role": "system", "content": __chatgpt_batch_role__},
+        {"role": "user", "content": json.dumps({post_id: f"{post}" for post_id, post in posts_by_id.items()})}
+    ]
+
 def _handle_openai_error(e):
     """Handle OpenAI API errors."""
+    import openai
     if isinstance(e, openai.RateLimitError):
         logger.error(f"Rate limit reached. Please wait before trying again.")
     elif isinstance(e, openai.AuthenticationError):
@@ -68,3 +369,12 @@ def _handle_openai_error(e):
     else:
         logger.error(f"An unexpected error occurred: {str(e)}")
     return None
+
+metrics.Callback("xcryptowatch_prefilter_posts_total", "Posts seen by the pre-filter, by outcome (escalated, filtered).",
+                 "counter", lambda: {(outcome,): prefilter_stats[outcome] for outcome in ("escalated", "filtered")},
+                 ["outcome"])
+metrics.Callback("xcryptowatch_cache_lookups_total", "Result cache lookups, by outcome (hits, disk_hits, misses).",
+                 "counter", lambda: _cache and {(outcome,): _cache.stats[outcome] for outcome in ("hits", "disk_hits", "misses")},
+                 ["outcome"])
+metrics.Callback("xcryptowatch_cache_entries", "Results held in the in-memory cache.",
+                 "gauge", lambda: _cache and get_cache_stats()["entries"])
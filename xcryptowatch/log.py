@@ -1,38 +1,161 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import threading
+from datetime import datetime, timezone
 import sys
 
-# Create logs directory if it doesn't exist
-if not os.path.exists('logs'):
-    os.makedirs('logs')
+__default_log_directory__ = "logs"
+__default_max_bytes__ = 10 * 1024 * 1024
+__default_backup_count__ = 5
 
-def setup_logger(name, log_file, level=logging.DEBUG):
-    """Set up a new logger with consistent formatting"""
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
-    file_handler = logging.FileHandler(f'logs/{log_file}', delay=False, encoding="utf-8")
-    file_handler.setFormatter(formatter)
-    
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    
+# Subsystem name (as used in the logging.levels config) -> (logger name, log file)
+__subsystems__ = {
+    "main": ("xcryptowatch", "xcryptowatch.log"),
+    "twitter": ("xcryptowatch_twitter", "twitter.log"),
+    "truth": ("xcryptowatch_truth", "truth.log"),
+    "bluesky": ("xcryptowatch_bluesky", "bluesky.log"),
+    "gpt": ("xcryptowatch_gpt", "gpt.log"),
+    "postal": ("xcryptowatch_postal", "postal.log"),
+}
+
+_queue = queue.SimpleQueue()
+_listener = None
+_listener_lock = threading.Lock()  # Guards starting and stopping _listener
+_exiting = False
+
+class JSONFormatter(logging.Formatter):
+    """One compact JSON object per line, for log shippers."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Keeps exc_info on queued records so the listener's formatter renders exceptions itself."""
+
+    def prepare(self, record):
+        # The queue never leaves the process, so the traceback need not be flattened into the message
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        if _listener is None:
+            _start_default_listener()
+        super().enqueue(record)
+
+def setup_logger(name, level=logging.DEBUG):
+    """Set up a logger that only enqueues records; the listener started by configure_logging() writes them"""
     logger = logging.getLogger(name)
     logger.setLevel(level)
     logger.handlers = []  # Clear existing handlers
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)  # Add console handler
+    logger.addHandler(_QueueHandler(_queue))
     logger.propagate = False
-    
+
     return logger
 
+def configure_logging(config=None):
+    """Start (or restart with new settings) the background thread that writes log records.
+
+    Loggers only put records on a queue, so logging from the event loop never
+    waits on disk or terminal I/O. Settings come from the optional top-level
+    ``logging`` section: directory, format ("text" or "json"), console,
+    levels per subsystem, and rotation by size (max_bytes, backup_count) or
+    by time (when, e.g. "midnight"). Until this is called, records are
+    written to the console only, so library use and scripts still see them.
+    """
+    global _listener
+    log_config = (config or {}).get('logging', {})
+    directory = log_config.get('directory', __default_log_directory__)
+    os.makedirs(directory, exist_ok=True)
+
+    formatter = JSONFormatter() if log_config.get('format', 'text') == 'json' else _text_formatter()
+
+    handlers = []
+    levels = log_config.get('levels', {})
+    for subsystem, (name, log_file) in __subsystems__.items():
+        file_handler = _create_file_handler(os.path.join(directory, log_file), log_config.get('rotation', {}))
+        file_handler.setFormatter(formatter)
+        file_handler.addFilter(logging.Filter(name))
+        handlers.append(file_handler)
+        logging.getLogger(name).setLevel(levels.get(subsystem, 'DEBUG').upper())
+
+    if log_config.get('console', True):
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    with _listener_lock:
+        _stop_listener()
+        _listener = logging.handlers.QueueListener(_queue, *handlers)
+        _listener.start()
+
+def shutdown_logging():
+    """Write out queued records and close the log files."""
+    with _listener_lock:
+        _stop_listener()
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def _start_default_listener():
+    """Write queued records to the console until configure_logging() replaces this listener."""
+    global _listener
+    with _listener_lock:
+        if _listener is not None or _exiting:
+            return
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(_text_formatter())
+        _listener = logging.handlers.QueueListener(_queue, console_handler)
+        _listener.start()
+
+def _text_formatter():
+    return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+def _shutdown_at_exit():
+    global _exiting
+    _exiting = True  # Records logged during interpreter shutdown must not start a new listener thread
+    shutdown_logging()
+
+def _create_file_handler(path, rotation):
+    if rotation.get('when'):
+        return logging.handlers.TimedRotatingFileHandler(
+            path,
+            when=rotation['when'],
+            backupCount=rotation.get('backup_count', __default_backup_count__),
+            encoding="utf-8"
+        )
+    return logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=rotation.get('max_bytes', __default_max_bytes__),
+        backupCount=rotation.get('backup_count', __default_backup_count__),
+        encoding="utf-8"
+    )
+
+atexit.register(_shutdown_at_exit)
+
 # Main application logger
-main_logger = setup_logger('xcryptowatch', 'xcryptowatch.log')
-twitter_logger = setup_logger('xcryptowatch_twitter', 'twitter.log')
-truth_logger = setup_logger('xcryptowatch_truth', 'truth.log')
-bluesky_logger = setup_logger('xcryptowatch_bluesky', 'bluesky.log')
-gpt_logger = setup_logger('xcryptowatch_gpt', 'gpt.log')
-postal_logger = setup_logger('xcryptowatch_postal', "postal.log")
\ No newline at end of file
+main_logger = setup_logger(__subsystems__['main'][0])
+twitter_logger = setup_logger(__subsystems__['twitter'][0])
+truth_logger = setup_logger(__subsystems__['truth'][0])
+bluesky_logger = setup_logger(__subsystems__['bluesky'][0])
+gpt_logger = setup_logger(__subsystems__['gpt'][0])
+postal_logger = setup_logger(__subsystems__['postal'][0])
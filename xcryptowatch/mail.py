@@ -1,86 +1,374 @@
-import postalsend
+import abc
 import asyncio
+import inspect
+import json
 import smtplib
+import sys
+import threading
+import time
+import urllib.request
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from xcryptowatch.config_json import postal_enabled, smtp_enabled
+from xcryptowatch.config_json import postal_enabled, smtp_enabled, webhook_enabled, file_sink_enabled
+from xcryptowatch import metrics
+from xcryptowatch.outbox import Outbox
 from xcryptowatch.log import postal_logger as logger
 
+__default_smtp_pool_size__ = 2
+__default_smtp_keepalive__ = 60  # seconds a session may idle before it is probed with NOOP
+__default_channel_timeout__ = 30  # seconds
+__default_smtp_socket_timeout__ = 10  # seconds per SMTP socket operation; well under the channel and outbox timeouts
 
-async def send_analysis(analysis, config):
-    subject = config['email'].get('subject', 'XCryptoWatch Analysis')
-    if postal_enabled(config):
-        logger.info(f"Sending analysis to Postal API...")
-        logger.debug(f"Server: {postalsend._app._get_server()} Key: {postalsend._app._get_api_key()}")
+_smtp_pool = None  # (settings, SMTPPool)
+_outbox = None
+channel_stats = {}  # channel -> {"sent", "failed", "last_latency", "total_latency"}
+
+class SMTPPool:
+    """Pool of authenticated SMTP sessions reused across messages.
+
+    Opening a session costs a TCP connect, STARTTLS and a login, so sessions
+    are kept open and handed out again. A session idle for longer than
+    ``keepalive`` seconds is probed with NOOP before reuse, and any session
+    the server has dropped is replaced transparently. Methods block and are
+    meant to run in a worker thread. Every socket operation is bounded by
+    ``timeout``, so a hung server fails the send in that thread instead of
+    leaving it running after the caller has given up.
+    """
+
+    def __init__(self, smtp_config, size=__default_smtp_pool_size__, keepalive=__default_smtp_keepalive__,
+                 timeout=__default_smtp_socket_timeout__):
+        self.smtp_config = smtp_config
+        self.size = size
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self._idle = []  # (last_used, smtplib.SMTP)
+        self._lock = threading.Lock()
+
+    def send_messages(self, msgs):
+        """Send every message over one session, reconnecting once if the session fails mid-way."""
+        server = self._checkout()
+        sent = 0
         try:
-            await asyncio.to_thread(
-                postalsend.push_send,
-                subject, 
-                tag=None, 
-                plain_body=analysis, 
-                html_body=None, 
-                attachments=None
-            )
-        except postalsend.errors.PostalError as e:
-            logger.error(f"Error sending analysis to Postal API: {e}")
-    if smtp_enabled(config):
-        logger.info(f"Sending analysis to SMTP server...")
-        logger.debug(f"Server: {config['email']['smtp']['host']} Port: {config['email']['smtp']['port']} Username: {config['email']['smtp']['username']}")
+            for msg in msgs:
+                try:
+                    server.send_message(msg)
+                except (smtplib.SMTPServerDisconnected, OSError):
+                    logger.warning("SMTP session dropped, reconnecting...")
+                    _quit(server)
+                    server = self._connect()
+                    server.send_message(msg)
+                sent += 1
+        except BaseException:
+            _quit(server)
+            raise
+        self._checkin(server)
+        return sent
+
+    def close(self):
+        """Close every idle session."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for _, server in idle:
+            _quit(server)
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                last_used, server = self._idle.pop()
+            if time.monotonic() - last_used < self.keepalive:
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            _quit(server)
+        return self._connect()
+
+    def _checkin(self, server):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((time.monotonic(), server))
+                return
+        _quit(server)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.smtp_config['host'], self.smtp_config.get('port', 587), timeout=self.timeout)
         try:
-            msg = MIMEMultipart()
-            msg['From'] = config['email']['from_email']
-            msg['To'] = ', '.join(config['email']['to_email'])
-            msg['Subject'] = subject
-            msg.attach(MIMEText(analysis, 'plain'))
+            if self.smtp_config.get('use_tls', True):
+                server.starttls()
+            if self.smtp_config.get('username') and self.smtp_config.get('password'):
+                server.login(self.smtp_config['username'], self.smtp_config['password'])
+        except BaseException:
+            _quit(server)
+            raise
+        logger.debug(f"Opened SMTP session to {self.smtp_config['host']}:{self.smtp_config.get('port', 587)}")
+        return server
 
-            await asyncio.to_thread(
-                _send_smtp_email,
-                config['email']['smtp'],
-                msg
-            )
-        except Exception as e:
-            logger.error(f"Error sending analysis via SMTP: {e}")
 
+class Notifier(abc.ABC):
+    """A notification channel.
 
-async def status_update(status, config):
-    subject = "XCryptoWatch Status Update"
-    if postal_enabled(config):
-        logger.info(f"Sending status update to Postal API...")
+    Subclasses set ``name`` (also the channel's key in the outbox and in
+    ``channel_stats``), say whether the configuration enables them, and send
+    a list of message bodies under one subject, raising on failure.
+    Register new channels with register_notifier().
+    """
+    name = None
+
+    def __init__(self, config):
+        self.config = config
+
+    @abc.abstractmethod
+    def enabled(self):
+        ...
+
+    def timeout(self):
+        return self.config['email'].get(self.name, {}).get('timeout', __default_channel_timeout__)
+
+    @abc.abstractmethod
+    async def send(self, subject, bodies):
+        ...
+
+
+class PostalNotifier(Notifier):
+    name = "postal"
+
+    def enabled(self):
+        return postal_enabled(self.config)
+
+    async def send(self, subject, bodies):
+        import postalsend
+        logger.info(f"Sending {len(bodies)} messages to Postal API...")
         logger.debug(f"Server: {postalsend._app._get_server()} Key: {postalsend._app._get_api_key()}")
-        try:
+        for body in bodies:
             await asyncio.to_thread(
                 postalsend.push_send,
-                subject,
+                subject, 
                 tag=None, 
-                plain_body=("STATUS UPDATE: " + status),
+                plain_body=body, 
                 html_body=None, 
                 attachments=None
             )
-        except postalsend.errors.PostalError as e:
-            logger.error(f"Error sending status update to Postal API: {e}")
-    elif smtp_enabled(config):
-        logger.info(f"Sending status update to SMTP server...")
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = config['email']['from_email']
-            msg['To'] = ', '.join(config['email']['to_email'])
-            msg['Subject'] = subject
-            msg.attach(MIMEText("STATUS UPDATE: " + status, 'plain'))
 
-            await asyncio.to_thread(
-                _send_smtp_email,
-                config['email']['smtp'],
-                msg
-            )
-        except Exception as e:
-            logger.error(f"Error sending status update via SMTP: {e}")
-
-
-def _send_smtp_email(smtp_config, msg):
-    """Helper function to send email via SMTP"""
-    with smtplib.SMTP(smtp_config['host'], smtp_config['port']) as server:
-        if smtp_config['use_tls']:
-            server.starttls()
-        if smtp_config['username'] and smtp_config['password']:
-            server.login(smtp_config['username'], smtp_config['password'])
-        server.send_message(msg)
\ No newline at end of file
+
+class SMTPNotifier(Notifier):
+    name = "smtp"
+
+    def enabled(self):
+        return smtp_enabled(self.config)
+
+    async def send(self, subject, bodies):
+        smtp_config = self.config['email']['smtp']
+        logger.info(f"Sending {len(bodies)} messages to SMTP server...")
+        logger.debug(f"Server: {smtp_config['host']} Port: {smtp_config['port']} Username: {smtp_config['username']}")
+        msgs = [_create_smtp_message(self.config, subject, body) for body in bodies]
+        await asyncio.to_thread(
+            _get_smtp_pool(smtp_config).send_messages,
+            msgs
+        )
+
+
+class WebhookNotifier(Notifier):
+    """POSTs each message as JSON ({"subject": ..., "body": ...}) to email.webhook.url."""
+    name = "webhook"
+
+    def enabled(self):
+        return webhook_enabled(self.config)
+
+    async def send(self, subject, bodies):
+        webhook_config = self.config['email']['webhook']
+        logger.info(f"Sending {len(bodies)} messages to webhook...")
+        for body in bodies:
+            await asyncio.to_thread(_post_json, webhook_config['url'], {"subject": subject, "body": body},
+                                    webhook_config.get('headers', {}), self.timeout())
+
+
+class FileNotifier(Notifier):
+    """Appends each message to email.file.path, or writes it to stdout when the path is "-"."""
+    name = "file"
+
+    def enabled(self):
+        return file_sink_enabled(self.config)
+
+    async def send(self, subject, bodies):
+        path = self.config['email']['file']['path']
+        text = "".join(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {subject}\n{body}\n\n" for body in bodies)
+        if path == "-":
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        else:
+            await asyncio.to_thread(_append_text, path, text)
+
+
+_notifiers = {notifier.name: notifier for notifier in (PostalNotifier, SMTPNotifier, WebhookNotifier, FileNotifier)}
+
+
+def register_notifier(notifier_class):
+    """Add a Notifier subclass as a channel. Raises TypeError if it leaves an abstract method out."""
+    if inspect.isabstract(notifier_class):
+        missing = ", ".join(sorted(notifier_class.__abstractmethods__))
+        raise TypeError(f"Notifier {notifier_class.__name__} does not implement: {missing}")
+    _notifiers[notifier_class.name] = notifier_class
+    return notifier_class
+
+
+def get_channel_stats():
+    """Return per-channel send counts and latencies."""
+    return {name: dict(stats) for name, stats in channel_stats.items()}
+
+
+async def send_analysis(analysis, config):
+    await send_analyses([analysis], config)
+
+
+async def send_analyses(analyses, config, subject=None):
+    """Send several analyses on every enabled channel.
+
+    With the outbox enabled (the default) the analyses are only written to
+    disk here; the outbox sender delivers them in the background and retries
+    failures. Without it they are sent inline and failures are logged.
+    """
+    subject = subject or config['email'].get('subject', 'XCryptoWatch Analysis')
+    outbox = get_outbox(config)
+    if outbox is None:
+        await _fan_out(subject, analyses, config)
+        return
+    for channel in _enabled_channels(config):
+        for analysis in analyses:
+            outbox.enqueue(channel, subject, analysis)
+        logger.info(f"Queued {len(analyses)} analyses for {channel} delivery.")
+
+
+def start_outbox(config):
+    """Open the outbox configured under email.outbox and start its sender. Returns None if disabled."""
+    global _outbox
+    outbox_config = config['email'].get('outbox', {})
+    if not outbox_config.get('enabled', True):
+        return None
+    path = outbox_config.get('path') or config.get('storage', {}).get('path', 'xcryptowatch.db')
+    _outbox = Outbox(
+        path,
+        lambda channel, subject, bodies: _deliver(channel, subject, bodies, config),
+        concurrency=outbox_config.get('concurrency', 2),
+        batch_size=outbox_config.get('batch_size', 20),
+        max_attempts=outbox_config.get('max_attempts', 8),
+        base_delay=outbox_config.get('base_delay', 30),
+        max_delay=outbox_config.get('max_delay', 60 * 60)
+    )
+    _outbox.start()
+    return _outbox
+
+
+def get_outbox(config):
+    """Return the running outbox, starting it on first use. Returns None if disabled."""
+    if _outbox is None:
+        return start_outbox(config)
+    return _outbox
+
+
+async def stop_outbox():
+    """Stop the outbox sender; anything undelivered is sent after the next start."""
+    global _outbox
+    if _outbox is not None:
+        await _outbox.stop()
+        _outbox = None
+
+
+async def _deliver(channel, subject, bodies, config):
+    """Send messages on one channel under its timeout, recording latency. Raises on failure."""
+    if channel not in _notifiers:
+        raise ValueError(f"Unknown notification channel: {channel}")
+    notifier = _notifiers[channel](config)
+    stats = channel_stats.setdefault(channel, {"sent": 0, "failed": 0, "last_latency": 0.0, "total_latency": 0.0})
+    start = time.monotonic()
+    try:
+        await asyncio.wait_for(notifier.send(subject, bodies), notifier.timeout())
+    except BaseException:
+        stats["failed"] += len(bodies)
+        metrics.notification_failures.inc(len(bodies), channel=channel)
+        raise
+    finally:
+        stats["last_latency"] = time.monotonic() - start
+        stats["total_latency"] += stats["last_latency"]
+        metrics.notification_seconds.observe(stats["last_latency"], channel=channel)
+    stats["sent"] += len(bodies)
+    metrics.notifications_sent.inc(len(bodies), channel=channel)
+    logger.debug(f"{channel} delivered {len(bodies)} messages in {stats['last_latency']:.2f}s")
+
+
+async def _fan_out(subject, bodies, config):
+    """Send on every enabled channel at once; one slow or failing channel does not hold up the others."""
+    channels = _enabled_channels(config)
+    results = await asyncio.gather(*(_deliver(channel, subject, bodies, config) for channel in channels),
+                                   return_exceptions=True)
+    for channel, result in zip(channels, results):
+        if isinstance(result, asyncio.TimeoutError):
+            logger.error(f"Timed out sending via {channel}!")
+        elif isinstance(result, BaseException):
+            logger.error(f"Error sending via {channel}: {result}")
+
+
+def _enabled_channels(config):
+    return [name for name, notifier in _notifiers.items() if notifier(config).enabled()]
+
+
+async def status_update(status, config):
+    await _fan_out("XCryptoWatch Status Update", ["STATUS UPDATE: " + status], config)
+
+
+def close_smtp_pool():
+    """Close the pooled SMTP sessions, e.g. on shutdown."""
+    global _smtp_pool
+    if _smtp_pool is not None:
+        _smtp_pool[1].close()
+        _smtp_pool = None
+
+
+def _create_smtp_message(config, subject, body):
+    msg = MIMEMultipart()
+    msg['From'] = config['email']['from_email']
+    msg['To'] = ', '.join(config['email']['to_email'])
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+
+def _get_smtp_pool(smtp_config):
+    """Return the shared pool, replacing it if the SMTP settings changed."""
+    global _smtp_pool
+    settings = tuple(sorted(smtp_config.items()))
+    if _smtp_pool is None or _smtp_pool[0] != settings:
+        if _smtp_pool is not None:
+            _smtp_pool[1].close()
+        _smtp_pool = (settings, SMTPPool(
+            smtp_config,
+            size=smtp_config.get('pool_size', __default_smtp_pool_size__),
+            keepalive=smtp_config.get('keepalive', __default_smtp_keepalive__),
+            timeout=smtp_config.get('socket_timeout', __default_smtp_socket_timeout__)
+        ))
+    return _smtp_pool[1]
+
+
+def _post_json(url, payload, headers, timeout):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), method="POST",
+                                     headers={"Content-Type": "application/json", **headers})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+def _append_text(path, text):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _quit(server):
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
+
+metrics.Callback("xcryptowatch_outbox_pending", "Notifications waiting in the outbox.",
+                 "gauge", lambda: _outbox and _outbox.pending())
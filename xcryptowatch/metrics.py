@@ -0,0 +1,185 @@
+import abc
+import asyncio
+import bisect
+import threading
+from xcryptowatch.log import main_logger as logger
+
+__default_host__ = "127.0.0.1"
+__default_port__ = 9464
+__default_buckets__ = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_metrics = []     # Every metric, in registration order
+_server = None
+
+class Metric(abc.ABC):
+    """Base for metrics rendered in the Prometheus text format."""
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self):
+        """Yield (suffix, labels tuple, extra labels, value) for rendering."""
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield "", key, (), value
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Callback(Metric):
+    """A counter or gauge whose values are read from ``fn`` at scrape time.
+
+    ``fn`` returns a number, or a dict mapping a tuple of label values (in
+    ``labelnames`` order) to a number, or None when there is nothing to report.
+    """
+
+    def __init__(self, name, help, type, fn, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.type = type
+        self.fn = fn
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception as e:
+            logger.error(f"Metric {self.name} failed to collect: {e}")
+            return
+        if values is None:
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            yield "", tuple(str(label) for label in key), (), value
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=__default_buckets__):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def count(self, **labels):
+        counts = self._values.get(self._key(labels))
+        return sum(counts[:-1]) if counts else 0
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(counts)) for key, counts in self._values.items()]
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", key, (("le", "+Inf" if bound == float("inf") else repr(float(bound))),), cumulative
+            yield "_sum", key, (), counts[-1]
+            yield "_count", key, (), cumulative
+
+def render():
+    """Return every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for suffix, key, extra, value in metric.samples():
+            labels = list(zip(metric.labelnames, key)) + list(extra)
+            label_text = ",".join(f'{name}="{_escape(label)}"' for name, label in labels)
+            lines.append(f"{metric.name}{suffix}{{{label_text}}} {value}" if label_text else f"{metric.name}{suffix} {value}")
+    return "\n".join(lines) + "\n"
+
+async def start_metrics_server(config):
+    """Serve render() at /metrics on metrics.host:metrics.port if metrics.enabled is set."""
+    global _server
+    metrics_config = config.get('metrics', {})
+    if not metrics_config.get('enabled', False) or _server is not None:
+        return None
+    host = metrics_config.get('host', __default_host__)
+    port = metrics_config.get('port', __default_port__)
+    _server = await asyncio.start_server(_handle_request, host, port)
+    logger.info(f"Serving metrics at http://{host}:{port}/metrics")
+    return _server
+
+async def stop_metrics_server():
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
+
+async def _handle_request(reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 10)
+        while (await asyncio.wait_for(reader.readline(), 10)) not in (b"\r\n", b"\n", b""):
+            pass  # Skip the headers
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", render().encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"Not found\n"
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+# Fetching
+posts_fetched = Counter("xcryptowatch_posts_fetched_total", "New posts queued for analysis, by platform and account.", ["platform", "account"])
+fetch_seconds = Histogram("xcryptowatch_fetch_seconds", "Latency of platform API calls.", ["platform"])
+fetch_errors = Counter("xcryptowatch_fetch_errors_total", "Platform API calls that raised.", ["platform"])
+rate_limit_hits = Counter("xcryptowatch_rate_limit_hits_total", "Times a platform reported a rate limit and fetches were paused.", ["platform"])
+poll_lateness = Histogram("xcryptowatch_poll_lateness_seconds", "How late scheduled polls started.", ["platform"])
+polls_skipped = Counter("xcryptowatch_polls_skipped_total", "Scheduled polls skipped because the previous one was still running or deadlines were missed.", ["platform"])
+polling_accounts = Gauge("xcryptowatch_polling_accounts", "Accounts per adaptive polling tier (hot, warm, cold).", ["platform", "tier"])
+
+# Analysis
+gpt_requests = Counter("xcryptowatch_gpt_requests_total", "OpenAI requests by outcome (ok, error, timeout).", ["outcome"])
+gpt_tokens = Counter("xcryptowatch_gpt_tokens_total", "OpenAI tokens used, by kind (prompt, completion).", ["kind"])
+gpt_seconds = Histogram("xcryptowatch_gpt_request_seconds", "Latency of OpenAI requests.")
+gpt_results = Counter("xcryptowatch_gpt_results_total", "Results of analyzed posts by kind (mention, nothing, error), excluding pre-filtered and in-cycle duplicate posts.", ["result"])
+
+# Notification
+notification_seconds = Histogram("xcryptowatch_notification_seconds", "Latency of a delivery on one channel.", ["channel"])
+notifications_sent = Counter("xcryptowatch_notifications_sent_total", "Messages delivered, by channel.", ["channel"])
+notification_failures = Counter("xcryptowatch_notification_failures_total", "Messages that failed to deliver, by channel.", ["channel"])
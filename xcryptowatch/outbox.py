@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import random
+import sqlite3
+import time
+from xcryptowatch.log import postal_logger as logger
+
+__default_concurrency__ = 2
+__default_batch_size__ = 20     # messages handed to one deliver() call
+__default_max_attempts__ = 8
+__default_base_delay__ = 30     # seconds before the first retry
+__default_max_delay__ = 60 * 60  # cap on the retry delay
+__default_timeout__ = 120       # seconds one delivery attempt may take
+__sent_retention__ = 24 * 60 * 60  # how long delivered rows are kept for deduplication
+__failed_retention__ = 7 * 24 * 60 * 60  # how long rows that were given up on are kept for inspection
+__purge_interval__ = 60 * 60  # seconds between purges of old rows while running
+
+class Outbox:
+    """Durable queue of outbound notifications, drained by a background sender.
+
+    Each row is one message for one channel. enqueue() only writes to SQLite
+    and returns, so callers never wait on a mail server. The sender groups
+    due rows by channel and subject and calls ``deliver(channel, subject,
+    bodies)`` with up to ``batch_size`` of them, at most ``concurrency``
+    calls at a time. Every row in a call shares its outcome. A failed row
+    is retried with exponential backoff and jitter until ``max_attempts``
+    is reached. Rows carry an idempotency key, so
+    enqueueing the same message twice delivers it once. Undelivered rows
+    survive restarts. Old sent and failed rows are purged every hour.
+
+    Delivery is at least once. An attempt that times out here is retried,
+    but a blocking send in a worker thread cannot be stopped, so it may
+    still have reached the server. Channels bound their own network calls
+    with socket timeouts shorter than ``timeout`` to make that rare.
+    """
+
+    def __init__(self, path, deliver, concurrency=__default_concurrency__, max_attempts=__default_max_attempts__,
+                 base_delay=__default_base_delay__, max_delay=__default_max_delay__, timeout=__default_timeout__,
+                 batch_size=__default_batch_size__):
+        self.deliver = deliver
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._db = sqlite3.connect(path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS outbox ("
+                         "id INTEGER PRIMARY KEY AUTOINCREMENT, idempotency_key TEXT NOT NULL UNIQUE, "
+                         "channel TEXT NOT NULL, subject TEXT NOT NULL, body TEXT NOT NULL, "
+                         "status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+                         "next_attempt_at REAL NOT NULL, created_at REAL NOT NULL, last_error TEXT)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+        self._purge()
+        self._wakeup = asyncio.Event()
+        self._sender = None
+
+    def enqueue(self, channel, subject, body, key=None):
+        """Store a message for delivery. Returns False if a message with the same key already exists."""
+        key = key or hashlib.sha256(f"{channel}\0{subject}\0{body}".encode("utf-8")).hexdigest()
+        now = time.time()
+        cursor = self._db.execute("INSERT OR IGNORE INTO outbox (idempotency_key, channel, subject, body, next_attempt_at, created_at) "
+                                  "VALUES (?, ?, ?, ?, ?, ?)", (key, channel, subject, body, now, now))
+        self._db.commit()
+        self._wakeup.set()
+        return cursor.rowcount == 1
+
+    def pending(self):
+        """Return the number of messages waiting to be delivered."""
+        return self._db.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    def start(self):
+        """Start the background sender on the running event loop."""
+        if self._sender is None or self._sender.done():
+            self._sender = asyncio.create_task(self._run())
+            logger.info(f"Outbox sender started ({self.pending()} messages pending).")
+
+    async def stop(self, drain_timeout=10):
+        """Give pending deliveries up to drain_timeout seconds, then stop the sender. Undelivered rows stay on disk."""
+        if self._sender is not None:
+            deadline = time.monotonic() + drain_timeout
+            while self._due(1) and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+            self._sender.cancel()
+            await asyncio.gather(self._sender, return_exceptions=True)
+            self._sender = None
+        self._db.close()
+
+    async def _run(self):
+        next_purge = time.monotonic() + __purge_interval__
+        while True:
+            if time.monotonic() >= next_purge:
+                self._purge()
+                next_purge = time.monotonic() + __purge_interval__
+            rows = self._due(self.concurrency * self.batch_size)
+            if not rows:
+                self._wakeup.clear()
+                wait = self._seconds_until_next()
+                wait = __purge_interval__ if wait is None else min(wait, __purge_interval__)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await asyncio.gather(*(self._attempt(batch) for batch in self._batches(rows)[:self.concurrency]))
+
+    def _batches(self, rows):
+        """Split due rows into lists of at most batch_size that share a channel and subject, oldest first."""
+        groups = {}
+        for row in rows:
+            groups.setdefault((row[1], row[2]), []).append(row)
+        return [group[i:i + self.batch_size] for group in groups.values() for i in range(0, len(group), self.batch_size)]
+
+    async def _attempt(self, rows):
+        channel, subject = rows[0][1], rows[0][2]
+        try:
+            await asyncio.wait_for(self.deliver(channel, subject, [row[3] for row in rows]), self.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Delivery of {len(rows)} {channel} messages failed ({e}).")
+            jitter = random.uniform(0.8, 1.2)  # Shared, so the batch is retried together
+            for row_id, _, _, _, attempts in rows:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    logger.error(f"Giving up on {channel} message {row_id} after {attempts} attempts: {e}")
+                    self._db.execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                                     (attempts, str(e), row_id))
+                else:
+                    delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * jitter
+                    logger.debug(f"Retry {attempts}/{self.max_attempts - 1} of {channel} message {row_id} in {delay:.0f}s.")
+                    self._db.execute("UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                                     (attempts, time.time() + delay, str(e), row_id))
+        else:
+            logger.debug(f"Delivered {len(rows)} {channel} messages.")
+            self._db.executemany("UPDATE outbox SET status = 'sent', attempts = ? WHERE id = ?",
+                                 [(attempts + 1, row_id) for row_id, _, _, _, attempts in rows])
+        self._db.commit()
+
+    def _purge(self):
+        """Delete sent rows past the deduplication window and failed rows past their retention."""
+        now = time.time()
+        cursor = self._db.execute("DELETE FROM outbox WHERE (status = 'sent' AND created_at < ?) OR (status = 'failed' AND created_at < ?)",
+                                  (now - __sent_retention__, now - __failed_retention__))
+        self._db.commit()
+        if cursor.rowcount:
+            logger.debug(f"Purged {cursor.rowcount} old outbox rows.")
+
+    def _due(self, limit):
+        return self._db.execute("SELECT id, channel, subject, body, attempts FROM outbox "
+                                "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                                (time.time(), limit)).fetchall()
+
+    def _seconds_until_next(self):
+        row = self._db.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
@@ -0,0 +1,205 @@
+import asyncio
+import xcryptowatch.mail as mail
+from xcryptowatch import metrics
+from xcryptowatch.digest import create_digest
+from xcryptowatch.gpt import analyze_posts_concurrently
+from xcryptowatch.log import main_logger as logger
+
+__default_analysis_workers__ = 4
+__default_notify_workers__ = 2
+__default_queue_size__ = 1000
+__default_batch_size__ = 20
+__default_drain_timeout__ = 30
+
+_pipeline = None
+
+class Pipeline:
+    """Fetch -> analysis -> notification stages joined by bounded queues.
+
+    Watchers submit posts and return to polling straight away. A pool of
+    analysis workers drains the analysis queue in batches, and a pool of
+    notification workers sends every positive result. When a queue is full,
+    submit() waits, so a slow stage pushes back on the one before it instead
+    of buffering without limit.
+    """
+
+    def __init__(self, config, analysis_workers=__default_analysis_workers__, notify_workers=__default_notify_workers__,
+                 queue_size=__default_queue_size__, batch_size=__default_batch_size__):
+        self.config = config
+        self.analysis_workers = analysis_workers
+        self.notify_workers = notify_workers
+        self.batch_size = batch_size
+        self.analysis_queue = asyncio.Queue(maxsize=queue_size)
+        self.notify_queue = asyncio.Queue(maxsize=queue_size)
+        self.digest = create_digest(config)
+        self._workers = []
+        self._submitting = set()  # submit() calls still queueing posts
+
+    def start(self):
+        """Start the worker pools."""
+        if self._workers:
+            return
+        self._workers = ([asyncio.create_task(self._analysis_worker(i)) for i in range(self.analysis_workers)] +
+                         [asyncio.create_task(self._notify_worker(i)) for i in range(self.notify_workers)])
+        logger.info(f"Pipeline started with {self.analysis_workers} analysis and {self.notify_workers} notification workers.")
+
+    async def submit(self, platform, posts, on_queued=None):
+        """Queue posts for analysis, waiting while the analysis queue is full.
+
+        Queueing runs in its own task, so it completes even if the caller is
+        cancelled (menu stop, shutdown); stop() waits for it before draining.
+        ``on_queued`` is called once every post is in the queue.
+        """
+        task = asyncio.create_task(self._enqueue(platform, posts, on_queued))
+        self._submitting.add(task)
+        task.add_done_callback(self._submitting.discard)
+        await asyncio.shield(task)
+
+    async def _enqueue(self, platform, posts, on_queued):
+        for post in posts:
+            await self.analysis_queue.put((platform, post))
+        logger.debug(f"Queued {len(posts)} {platform} posts. Queue depths: {self.queue_depths()}")
+        if on_queued is not None:
+            on_queued()
+
+    def queue_depths(self):
+        """Return the number of items waiting in each stage."""
+        return {"analysis": self.analysis_queue.qsize(), "notify": self.notify_queue.qsize()}
+
+    async def stop(self, drain_timeout=__default_drain_timeout__):
+        """Let queued work finish for up to drain_timeout seconds, then cancel the workers."""
+        if not self._workers:
+            return
+        logger.info(f"Stopping pipeline, draining {self.queue_depths()}...")
+        try:
+            await asyncio.wait_for(self._drain(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Pipeline did not drain within {drain_timeout} seconds. Dropping {self.queue_depths()}.")
+        # Anything still queueing now was never queued, so it is not marked seen and is fetched again
+        tasks = list(self._submitting) + self._workers
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        if self.digest is not None:
+            await self.digest.close()
+
+    async def _drain(self):
+        while self._submitting:
+            await asyncio.gather(*self._submitting, return_exceptions=True)
+        await self.analysis_queue.join()
+        await self.notify_queue.join()
+
+    async def _analysis_worker(self, worker_id):
+        while True:
+            batch = [await self.analysis_queue.get()]
+            while len(batch) < self.batch_size and not self.analysis_queue.empty():
+                batch.append(self.analysis_queue.get_nowait())
+            try:
+                results = await analyze_posts_concurrently([post for _, post in batch])
+                for (platform, _), result in zip(batch, results):
+                    if not result or isinstance(result, BaseException):
+                        logger.error(f"Analysis worker {worker_id}: {platform} post returned error!")
+                    elif result == "nothing":
+                        logger.debug(f"Analysis worker {worker_id}: {platform} post has no crypto mention.")
+                    else:
+                        logger.info(f"Analysis worker {worker_id}: {platform} post returned result: {result}")
+                        await self.notify_queue.put((platform, result))
+            except Exception as e:
+                logger.error(f"Analysis worker {worker_id} failed on a batch of {len(batch)} posts: {e}")
+            finally:
+                for _ in batch:
+                    self.analysis_queue.task_done()
+
+    async def _notify_worker(self, worker_id):
+        while True:
+            batch = [await self.notify_queue.get()]
+            while len(batch) < self.batch_size and not self.notify_queue.empty():
+                batch.append(self.notify_queue.get_nowait())
+            try:
+                if self.digest is not None:
+                    for platform, result in batch:
+                        await self.digest.add(platform, result)
+                    continue
+                logger.info(f"Notification worker {worker_id}: sending {len(batch)} results to any configured emails...")
+                await mail.send_analyses([result for _, result in batch], self.config)
+            except Exception as e:
+                logger.error(f"Notification worker {worker_id} failed to send {len(batch)} results: {e}")
+            finally:
+                for _ in batch:
+                    self.notify_queue.task_done()
+
+class PendingPosts:
+    """New posts found by one poll, recorded in the store only once they are queued for analysis.
+
+    Nothing is marked seen and no high-water mark moves until submit() has
+    put every post in the analysis queue. A poll cancelled before that
+    fetches the same posts again instead of losing them.
+    """
+
+    def __init__(self, platform, store):
+        self.platform = platform
+        self.store = store
+        self.texts = []
+        self._seen = []        # (account, post id), in the order found
+        self._keys = set()
+        self._high_water = {}  # account -> marker
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, account, post_id, text):
+        """Add a post unless it was seen before. Returns True if it was new."""
+        key = (account.lower(), str(post_id))
+        if key in self._keys or self.store.is_seen(self.platform, account, post_id):
+            return False
+        self._keys.add(key)
+        self._seen.append((account, post_id))
+        self.texts.append(text)
+        return True
+
+    def advance(self, account, marker):
+        """Move an account's high-water mark once the posts are queued."""
+        self._high_water[account] = marker
+
+    def commit(self):
+        for account, _ in self.store.mark_seen_many(self.platform, self._seen, self._high_water):
+            metrics.posts_fetched.inc(platform=self.platform, account=account)
+
+    async def submit(self, config):
+        """Queue the posts for analysis, then record them in the store."""
+        if self.texts:
+            await get_pipeline(config).submit(self.platform, self.texts, on_queued=self.commit)
+        else:
+            self.commit()
+
+def start_pipeline(config):
+    """Create and start the shared pipeline from the configuration."""
+    global _pipeline
+    pipeline_config = config.get('pipeline', {})
+    _pipeline = Pipeline(
+        config,
+        analysis_workers=pipeline_config.get('analysis_workers', __default_analysis_workers__),
+        notify_workers=pipeline_config.get('notify_workers', __default_notify_workers__),
+        queue_size=pipeline_config.get('queue_size', __default_queue_size__),
+        batch_size=pipeline_config.get('batch_size', __default_batch_size__)
+    )
+    _pipeline.start()
+    return _pipeline
+
+def get_pipeline(config):
+    """Return the shared pipeline, starting one if start_pipeline() was never called."""
+    if _pipeline is None:
+        return start_pipeline(config)
+    return _pipeline
+
+async def stop_pipeline():
+    """Drain and stop the shared pipeline, if it is running."""
+    global _pipeline
+    if _pipeline is not None:
+        await _pipeline.stop()
+        _pipeline = None
+
+metrics.Callback("xcryptowatch_queue_depth", "Items waiting in each pipeline stage.",
+                 "gauge", lambda: _pipeline and {(stage,): depth for stage, depth in _pipeline.queue_depths().items()},
+                 ["stage"])
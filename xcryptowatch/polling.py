@@ -0,0 +1,121 @@
+import time
+from collections import deque
+from xcryptowatch import metrics
+from xcryptowatch.log import main_logger as logger
+
+__default_history__ = 20   # Post timestamps kept per account to estimate its rate
+__default_min_interval__ = 1  # minutes
+__default_max_interval__ = 60  # minutes
+
+HOT, WARM, COLD = "hot", "warm", "cold"
+
+_tiers = {}  # platform -> (settings, PollingTiers)
+
+class PollingTiers:
+    """Per-account polling intervals learned from each account's posting rate.
+
+    An account's rate is its recent post count over the time from the oldest
+    of those posts until now, so a quiet account's rate keeps falling
+    between posts. An account expected to post at least once per ``base``
+    interval is hot and polled every ``floor`` seconds. One not expected to
+    post within ``ceiling`` seconds is cold and polled every ``ceiling``
+    seconds. Everything else, including accounts with too little history,
+    is warm and polled every ``base`` seconds.
+
+    With ``budget`` (requests per second) set, all intervals are stretched
+    evenly whenever the accounts together would poll faster than that.
+    Hot accounts keep the shortest intervals, so they get most of the
+    platform's rate limit. Rates are learned in memory and relearned after a restart.
+    """
+
+    def __init__(self, base, floor, ceiling, budget=None, history=__default_history__):
+        self.base = base
+        self.floor = min(floor, base)
+        self.ceiling = max(ceiling, base)
+        self.budget = budget
+        self.history = history
+        self._posts = {}     # account -> deque of post timestamps (epoch seconds), oldest first
+        self._intervals = {HOT: self.floor, WARM: self.base, COLD: self.ceiling}
+        self._scale = 1.0    # Stretch applied to every interval to stay within budget
+
+    def record(self, account, timestamps):
+        """Add the creation times (epoch seconds) of newly found posts."""
+        posts = self._posts.setdefault(account, deque(maxlen=self.history))
+        for timestamp in sorted(timestamps):
+            if not posts or timestamp > posts[-1]:
+                posts.append(timestamp)
+
+    def rate(self, account, now=None):
+        """Return the estimated posts per second, or None with fewer than two posts seen."""
+        posts = self._posts.get(account)
+        if not posts or len(posts) < 2:
+            return None
+        now = time.time() if now is None else now
+        return len(posts) / max(now - posts[0], 1.0)
+
+    def tier(self, account, now=None):
+        rate = self.rate(account, now)
+        if rate is None:
+            return WARM
+        if rate * self.base >= 1:
+            return HOT
+        if rate * self.ceiling < 1:
+            return COLD
+        return WARM
+
+    def interval(self, account):
+        """Return the seconds to wait before polling ``account`` again."""
+        return self._intervals[self.tier(account)] * self._scale
+
+    def rebalance(self, accounts):
+        """Forget accounts no longer watched and recompute the budget stretch for the rest."""
+        accounts = set(accounts)
+        for account in set(self._posts) - accounts:
+            del self._posts[account]
+        self._scale = 1.0
+        if self.budget and accounts:
+            demand = sum(1 / self._intervals[self.tier(account)] for account in accounts)
+            self._scale = max(1.0, demand / self.budget)
+
+    def counts(self, accounts):
+        counts = {HOT: 0, WARM: 0, COLD: 0}
+        for account in accounts:
+            counts[self.tier(account)] += 1
+        return counts
+
+def adaptive_enabled(platform, config):
+    return config.get(platform, {}).get('adaptive', {}).get('enabled', False)
+
+def get_tiers(platform, config):
+    """Return the platform's PollingTiers, rebuilding it if its configured intervals changed."""
+    from xcryptowatch.social.fetch import get_bucket
+    settings = config[platform].get('adaptive', {})
+    settings = (60 * int(config[platform]['check_interval']),
+                60 * settings.get('min_interval', __default_min_interval__),
+                60 * settings.get('max_interval', __default_max_interval__),
+                settings.get('budget', get_bucket(platform, config).rate))
+    cached = _tiers.get(platform)
+    if cached is None or cached[0] != settings:
+        _tiers[platform] = (settings, PollingTiers(*settings))
+        logger.debug(f"{platform} adaptive polling: every {settings[1]}s (hot) to {settings[2]}s (cold)")
+    return _tiers[platform][1]
+
+def poll_interval(platform, account, config):
+    """Return the seconds between polls of one account: its tier interval, or check_interval."""
+    if not adaptive_enabled(platform, config):
+        return 60 * int(config[platform]['check_interval'])
+    return get_tiers(platform, config).interval(account)
+
+def rebalance(platform, accounts, config):
+    """Update the budget stretch and tier metrics after the watched accounts were synced."""
+    if not adaptive_enabled(platform, config):
+        return
+    tiers = get_tiers(platform, config)
+    tiers.rebalance(accounts)
+    for tier, count in tiers.counts(accounts).items():
+        metrics.polling_accounts.set(count, platform=platform, tier=tier)
+
+def record_poll(platform, account, timestamps, config):
+    """Learn from the creation times (epoch seconds) of the new posts a poll found."""
+    if adaptive_enabled(platform, config) and timestamps:
+        get_tiers(platform, config).record(account, timestamps)
@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """Async token bucket sized to an API rate-limit window.
+
+    Holds up to ``requests`` tokens and refills at ``requests / window`` tokens
+    per second, so a burst can use the whole window's allowance but the
+    long-run rate never exceeds the limit. Waiters are served in FIFO order.
+    """
+
+    def __init__(self, requests, window):
+        self.capacity = float(requests)
+        self.rate = requests / window
+        self._tokens = float(requests)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens=1):
+        """Wait until ``tokens`` tokens are available and take them."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for ``seconds`` and empty the bucket, e.g. after an HTTP 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    def available(self):
+        """Return the number of tokens currently available."""
+        self._refill(time.monotonic())
+        return self._tokens
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
@@ -0,0 +1,128 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from xcryptowatch import metrics
+from xcryptowatch.log import main_logger as logger
+
+__default_jitter__ = 0.05   # Fraction of the interval each run may fire early or late
+__late_warning__ = 0.25     # Warn when a run starts this fraction of its interval late
+
+class _Entry:
+    __slots__ = ("key", "job", "interval", "due", "fire_at", "task")
+
+    def __init__(self, key, job, interval):
+        self.key = key
+        self.job = job
+        self.interval = interval
+        self.due = 0.0      # Deadline on the fixed-rate grid, without jitter
+        self.fire_at = 0.0  # Deadline with this run's jitter applied
+        self.task = None
+
+class PollScheduler:
+    """Runs periodic poll jobs on fixed-rate, jittered deadlines.
+
+    Each job's deadlines lie on a grid of its interval, so the time a run
+    takes never pushes the next one back. New jobs start at a random phase
+    within their first interval, which spreads many accounts evenly instead
+    of firing them in one burst. Every run is moved by up to ``jitter``
+    times the interval, but the grid itself does not move.
+
+    A run is skipped when the job's previous run is still going, and missed
+    deadlines are skipped rather than replayed. Both are counted, and how
+    late each run started is recorded in metrics.
+    """
+
+    def __init__(self, name, jitter=__default_jitter__):
+        self.name = name
+        self.jitter = jitter
+        self._entries = {}  # key -> _Entry
+        self._heap = []     # (fire_at, seq, entry)
+        self._seq = itertools.count()
+        self._tasks = set()  # Runs in progress, including those of cancelled keys
+        self._wakeup = asyncio.Event()
+
+    def schedule(self, key, job, interval, spread=True):
+        """Run ``job`` (a coroutine function) every ``interval()`` seconds under ``key``.
+
+        ``interval`` is a zero-argument callable, read again for every run, so
+        intervals can change while the job is scheduled. Scheduling an existing
+        key replaces its job and interval but keeps its deadline. With
+        ``spread`` off the first run is due immediately.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.job = job
+            entry.interval = interval
+            return
+        entry = self._entries[key] = _Entry(key, job, interval)
+        now = time.monotonic()
+        entry.due = entry.fire_at = now + (random.uniform(0, interval()) if spread else 0)
+        self._push(entry)
+
+    def cancel(self, key):
+        """Stop scheduling ``key``. A run already in progress is left to finish."""
+        self._entries.pop(key, None)
+
+    def keys(self):
+        return set(self._entries)
+
+    async def run(self):
+        """Fire jobs as they come due, until cancelled. Running jobs are cancelled with it."""
+        try:
+            while True:
+                self._wakeup.clear()
+                while self._heap and self._entries.get(self._heap[0][2].key) is not self._heap[0][2]:
+                    heapq.heappop(self._heap)  # Cancelled or replaced
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    self._fire(heapq.heappop(self._heap)[2], now)
+                    continue
+                timeout = self._heap[0][0] - now if self._heap else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            tasks = list(self._tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _fire(self, entry, now):
+        interval = entry.interval()
+        lateness = now - entry.fire_at
+        metrics.poll_lateness.observe(lateness, platform=self.name)
+        if lateness > __late_warning__ * interval:
+            logger.warning(f"{self.name} poll {entry.key} started {lateness:.1f}s late.")
+
+        if entry.task is not None and not entry.task.done():
+            metrics.polls_skipped.inc(platform=self.name)
+            logger.warning(f"{self.name} poll {entry.key} is still running after {interval:.0f}s! Skipping this run.")
+        else:
+            entry.task = asyncio.create_task(self._run_job(entry))
+            self._tasks.add(entry.task)
+            entry.task.add_done_callback(self._tasks.discard)
+
+        entry.due += interval
+        if entry.due <= now:
+            missed = int((now - entry.due) // interval) + 1
+            metrics.polls_skipped.inc(missed, platform=self.name)
+            entry.due += missed * interval
+        entry.fire_at = entry.due + random.uniform(-self.jitter, self.jitter) * interval
+        self._push(entry)
+
+    async def _run_job(self, entry):
+        try:
+            await entry.job()
+        except Exception as e:
+            logger.error(f"{self.name} poll {entry.key} failed: {e}")
+
+    def _push(self, entry):
+        heapq.heappush(self._heap, (entry.fire_at, next(self._seq), entry))
+        self._wakeup.set()
+
+def create_scheduler(name, config):
+    """Return a PollScheduler with the configured jitter (scheduler.jitter)."""
+    return PollScheduler(name, config.get('scheduler', {}).get('jitter', __default_jitter__))
@@ -1,55 +1,463 @@
-from atproto import AsyncClient
 import datetime
+import functools
 import asyncio
+import json
+import re
+import time
+import urllib.parse
 import xcryptowatch.mail as mail
 from xcryptowatch.log import bluesky_logger as logger
-from xcryptowatch.gpt import analyze_posts_concurrently
+from xcryptowatch.pipeline import PendingPosts
+from xcryptowatch.store import get_store
+from xcryptowatch.polling import poll_interval, rebalance, record_poll
+from xcryptowatch.scheduler import create_scheduler
+from xcryptowatch.social.fetch import fetch_accounts, fetch_one, pause_platform
+
+__timestamp_pattern__ = re.compile(r"^(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2})?)(?:[.,](\d+))?([Zz]|[+-]\d{2}:?\d{2})?$")
+__default_jetstream_url__ = "wss://jetstream2.us-east.bsky.network/subscribe"
+__post_collection__ = "app.bsky.feed.post"
+__default_did_ttl__ = 7 * 24 * 60 * 60  # seconds
+__default_max_pages__ = 5
+__feed_page_size__ = 50
+__timeline_page_size__ = 100
+__default_flush_seconds__ = 5
+__cursor_rewind_us__ = 5 * 1000 * 1000  # Replay a few seconds on reconnect; the seen store drops repeats
+__stream_marker__ = "@stream"  # High-water key for the stream cursor (Jetstream time_us)
+__sync_key__ = "@sync"  # Scheduler key of the job that keeps the poll jobs in sync with the config
+# High-water keys for the shared home and list timelines (created_at ms)
+__timeline_marker__ = "@timeline"
+__list_marker__ = "@list"
+__max_backoff__ = 60
+__stream_queue_size__ = 10000  # Events buffered before the reader waits for analysis to catch up
+__resubscribe_check_seconds__ = 30
+__rate_limit_pause__ = 5 * 60  # seconds, when a 429 response does not say when the limit resets
+
+_followed = {}  # service account DID -> DIDs it follows as of the last sync
 
 async def watch_bluesky(client, config):
-    watched_posts = []
+    store = get_store()
     await mail.status_update(f"Starting new bluesky watch at {datetime.datetime.now(datetime.timezone.utc)}.", config)
+    if config['bluesky'].get('ingest_mode', 'accounts') == 'stream':
+        await _watch_stream(client, store, config)
+        return
+
+    scheduler = create_scheduler('bluesky', config)
+    start_ms = _now_ms()
+    scheduler.schedule(__sync_key__, functools.partial(_sync_polls, client, store, config, scheduler, start_ms),
+                       functools.partial(_check_interval, config), spread=False)
+    await scheduler.run()
+
+async def _sync_polls(client, store, config, scheduler, start_ms):
+    """Keep the scheduled poll jobs in line with the watched accounts and the ingestion mode.
+
+    The accounts mode gets one job per account; the timeline mode gets a
+    single job that reads all accounts at once.
+    """
+    dids = await _resolve_dids(client, _watched_handles(config), store, config)
+    if config['bluesky'].get('ingest_mode', 'accounts') == 'timeline':
+        polls = {__timeline_marker__: functools.partial(_poll_timeline, client, dids, store, config, start_ms)}
+        scheduler.schedule(__timeline_marker__, functools.partial(_submit_after, store, config, polls[__timeline_marker__]),
+                           functools.partial(_check_interval, config), spread=False)
+    else:
+        polls = {account_username: functools.partial(_poll_account, client, store, config, account_username, did, start_ms)
+                 for account_username, did in dids.items()}
+        for account_username, poll in polls.items():
+            scheduler.schedule(account_username, functools.partial(_submit_after, store, config, poll),
+                               functools.partial(poll_interval, 'bluesky', account_username, config))
+        rebalance('bluesky', dids, config)
+    for key in scheduler.keys() - set(polls) - {__sync_key__}:
+        scheduler.cancel(key)
+
+async def _submit_after(store, config, poll):
+    """Run one poll, queue the new posts it found for analysis, then record them as seen."""
+    pending = PendingPosts('bluesky', store)
+    await poll(pending)
+    await pending.submit(config)
+
+def _check_interval(config):
+    return 60*int(config['bluesky']['check_interval'])
+
+async def _poll_account(client, store, config, account_username, did, start_ms, pending):
+    """Default ingestion: one paged author feed read per watched account.
+
+    The author feed is newest first, so pages are followed with the cursor
+    only until one reaches a post at or before the last one seen, or
+    bluesky.max_pages. Each page is one rate-limited request. The boundary
+    post itself is returned again; the seen store drops it. If paging stops
+    at the cap, the rest is skipped with a warning.
+    """
+    high_water = store.get_high_water('bluesky', account_username)
+    # Resume after the newest post we have already seen, even across restarts
+    newer_than = _high_water_ms(high_water) if high_water else start_ms
+    max_pages = config['bluesky'].get('max_pages', __default_max_pages__)
+    posts = []
+    cursor = None
+    more = False
+    try:
+        for _ in range(max_pages):
+            page = await fetch_one('bluesky', functools.partial(client.get_author_feed, actor=did, cursor=cursor, limit=__feed_page_size__), config)
+            page_posts, reached_old = _page_posts(page, newer_than)
+            posts.extend(post for _, post in page_posts)
+            cursor = page.cursor
+            more = not reached_old and bool(cursor) and bool(page.feed)
+            if not more:
+                break
+    except Exception as e:
+        _log_fetch_error(f"fetching posts for @{account_username}", e, config)
+        return
+    if more:
+        logger.warning(f"@{account_username} has more than {max_pages} pages of new posts! Older ones are skipped.")
+    if not posts:
+        logger.debug(f"No new posts for @{account_username}.")
+        return
+
+    record_poll('bluesky', account_username, [created_ms / 1000 for _, created_ms, _ in posts], config)
+    _collect_posts(account_username, posts, pending)
+    pending.advance(account_username, max(created_ms for _, created_ms, _ in posts))
+
+async def _poll_timeline(client, dids, store, config, start_ms, pending):
+    """Timeline ingestion: read every watched account through one shared, paged feed.
+
+    By default the logged-in account follows each watched account and its
+    home timeline is read. With bluesky.list_uri set, that list's feed is
+    read instead and its members are left to whoever curates the list.
+    Pages are read newest first until one reaches the last post seen, or
+    bluesky.max_pages. Posts by accounts that are not watched are ignored.
+    """
+    list_uri = config['bluesky'].get('list_uri')
+    if list_uri:
+        marker = f"{__list_marker__}:{list_uri}"
+        read_page = functools.partial(_get_list_feed, client, list_uri)
+    else:
+        marker = __timeline_marker__
+        read_page = client.get_timeline
+        try:
+            await _sync_follows(client, dids, config)
+        except Exception as e:
+            _log_fetch_error("following watched accounts", e, config)
+            return
+
+    high_water = store.get_high_water('bluesky', marker)
+    newer_than = _high_water_ms(high_water) if high_water else start_ms
+    max_pages = config['bluesky'].get('max_pages', __default_max_pages__)
+    handles_by_did = {did: handle for handle, did in dids.items()}
+    posts = []
+    cursor = None
+    more = False
+    try:
+        for _ in range(max_pages):
+            page = await fetch_one('bluesky', functools.partial(read_page, cursor=cursor, limit=__timeline_page_size__), config)
+            page_posts, reached_old = _page_posts(page, newer_than)
+            posts.extend((feed_view.post.author.did,) + post for feed_view, post in page_posts)
+            cursor = page.cursor
+            more = not reached_old and bool(cursor) and bool(page.feed)
+            if not more:
+                break
+    except Exception as e:
+        _log_fetch_error(f"fetching the {'list' if list_uri else 'home'} timeline", e, config)
+        return
+    if more:
+        logger.warning(f"The {'list' if list_uri else 'home'} timeline has more than {max_pages} pages of new posts! Older ones are skipped.")
+
+    logger.info(f"Fetched {len(posts)} new posts from the {'list' if list_uri else 'home'} timeline...")
+    for did, uri, created_ms, text in posts:
+        account_username = handles_by_did.get(did)
+        if account_username is not None:
+            _collect_posts(account_username, [(uri, created_ms, text)], pending)
+    if posts:
+        pending.advance(marker, max(created_ms for _, _, created_ms, _ in posts))
+
+async def _sync_follows(client, dids, config):
+    """Follow any watched account the logged-in account does not follow yet.
 
+    Accounts are never unfollowed: the service account may follow others for
+    its own reasons, and the timeline reader ignores authors that are not
+    watched anyway.
+    """
+    wanted = set(dids.values())
+    me = client.me.did
+    if _followed.get(me, set()) >= wanted:
+        return
+
+    followed = set()
+    cursor = None
     while True:
-        start_time = datetime.datetime.now(datetime.timezone.utc)# - datetime.timedelta(days=1)
-        to_process = []
-        for account in config['watch_accounts']:
-            if account.get('platform', '').lower() != 'bluesky':
+        page = await fetch_one('bluesky', functools.partial(client.get_follows, me, cursor=cursor, limit=100), config)
+        followed.update(profile.did for profile in page.follows)
+        cursor = page.cursor
+        if not cursor or not page.follows:
+            break
+
+    for did in wanted - followed:
+        await fetch_one('bluesky', functools.partial(client.follow, did), config)
+    logger.info(f"Followed {len(wanted - followed)} watched accounts from @{client.me.handle}.")
+    _followed[me] = followed | wanted
+
+async def _get_list_feed(client, list_uri, cursor=None, limit=None):
+    return await client.app.bsky.feed.get_list_feed({'list': list_uri, 'cursor': cursor, 'limit': limit})
+
+def _collect_posts(account_username, posts, pending):
+    """Queue posts that have not been seen before."""
+    for uri, created_ms, text in posts:
+        if pending.add(account_username, uri, text):
+            logger.info(f"Found {len(pending)} posts to process...")
+
+def _page_posts(page, newer_than):
+    """Return ([(feed_view, (uri, created_at ms, text))], reached_old) for one newest-first feed page.
+
+    Reposts are skipped: their timestamps belong to the original post.
+    Posts whose client-set createdAt cannot be parsed are skipped too.
+    """
+    posts = []
+    for feed_view in page.feed:
+        if getattr(feed_view, 'reason', None) is not None:
+            continue
+        try:
+            created_ms = _timestamp_ms(feed_view.post.record.created_at)
+        except (TypeError, ValueError):
+            logger.warning(f"Skipping {feed_view.post.uri}: unreadable createdAt {feed_view.post.record.created_at!r}")
+            continue
+        if created_ms < newer_than:
+            return posts, True
+        posts.append((feed_view, (feed_view.post.uri, created_ms, feed_view.post.record.text)))
+    return posts, False
+
+async def _watch_stream(client, store, config):
+    """Streaming ingestion: subscribe to Jetstream and analyze watched accounts' posts as they arrive.
+
+    Events are filtered server-side to the watched DIDs. Posts are handed to
+    analysis in small batches every bluesky.stream_flush_seconds. The event
+    cursor is persisted so a reconnect or restart resumes where it stopped.
+    With bluesky.replay_file set, events are read from a local JSON-lines
+    capture instead of the network.
+    """
+    from websockets.exceptions import WebSocketException  # Only stream mode needs it
+    queue = asyncio.Queue(maxsize=__stream_queue_size__)
+    consumer = asyncio.create_task(_consume_stream(queue, store, config))
+    backoff = 1
+    try:
+        while True:
+            dids = set((await _resolve_dids(client, _watched_handles(config), store, config)).values())
+            if not dids:
+                logger.error("No Bluesky accounts could be resolved! Retrying in 60 seconds...")
+                await asyncio.sleep(60)
                 continue
-            account_username = account['username']
-            logger.info(f"Fetching posts for @{account_username}...")
-            profile_feed = client.get_author_feed(actor=account_username)
-            if profile_feed:
-                for feed_view in profile_feed.feed:
-                    if feed_view.post.record.createdAt > start_time:
-                        if feed_view.post.uri not in watched_posts:
-                            watched_posts.append(feed_view.post.uri)
-                            to_process.append(feed_view.post.record.text)
-                            logger.info(f"Found {len(to_process)} posts to process...")
-                    if len(watched_posts) > 100 * len(config['watch_accounts']):
-                        watched_posts = watched_posts[-(100 * len(config['watch_accounts'])):]
-            else:
-                logger.error(f"Fetched user contains no data (posts may be too old)! Account: @{account_username}. Moving to next account...")
-
-        if to_process:
-            await _process_posts(to_process, config)
-        to_process.clear()
-
-        logger.info(f"Waiting for {config['bluesky']['check_interval']} minutes till next post check...")
-        await asyncio.sleep(60*int(config['bluesky']['check_interval']))
-
-# Post processing
-
-async def _process_posts(posts, config):
-    results = await analyze_posts_concurrently(posts)
-    if results:
-        for i, result in enumerate(results):
-            if not result:
-                logger.error(f"Task {i} returned error!")
-            elif result == "nothing":
-                logger.debug(f"Task {i}: No crypto mention.")
-            else:
-                logger.info(f"Task {i} returned result: {result}")
-                logger.info(f"Task {i} sending result to any configured emails...")
-                await mail.send_analysis(result, config)
+
+            cursor = store.get_high_water('bluesky', __stream_marker__)
+            cursor = int(cursor) - __cursor_rewind_us__ if cursor else None
+            replay_file = config['bluesky'].get('replay_file')
+            try:
+                if replay_file:
+                    await _supervise(_replay(replay_file, dids, cursor, queue), consumer)
+                    return
+                await _supervise(_read_jetstream(config, dids, cursor, queue), consumer)
+                backoff = 1  # Only a deliberate resubscribe returns; server closes raise below
+            except (OSError, WebSocketException) as e:
+                logger.error(f"Jetstream connection lost: {e}. Reconnecting in {backoff} seconds...")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, __max_backoff__)
+    finally:
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+
+async def _supervise(reader, consumer):
+    """Run ``reader`` alongside the consumer task and return its result.
+
+    If the consumer stops first the reader is cancelled and the consumer's
+    error is raised, so a full queue cannot block the reader forever.
+    """
+    reader = asyncio.create_task(reader)
+    try:
+        await asyncio.wait({reader, consumer}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        if not reader.done():
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+    if reader.cancelled():
+        consumer.result()  # Raises the consumer's error
+        raise RuntimeError("Bluesky stream consumer stopped unexpectedly!")
+    return reader.result()
+
+async def _replay(path, dids, cursor, queue):
+    await _read_replay(path, dids, cursor, queue)
+    logger.info(f"Finished replaying {path}.")
+    await queue.join()
+
+async def _read_jetstream(config, dids, cursor, queue):
+    """Read events from Jetstream until the connection drops or the watched accounts change.
+
+    The watched accounts are checked on a timer, so a change is picked up
+    even while they are quiet. Returns only to resubscribe; any close,
+    including a clean one from the server, raises.
+    """
+    import websockets
+    params = [("wantedCollections", __post_collection__)] + [("wantedDids", did) for did in dids]
+    if cursor:
+        params.append(("cursor", str(cursor)))
+    url = f"{config['bluesky'].get('jetstream_url', __default_jetstream_url__)}?{urllib.parse.urlencode(params)}"
+    handles = set(_watched_handles(config))
+    next_check = time.monotonic() + __resubscribe_check_seconds__
+
+    logger.info(f"Connecting to Jetstream for {len(dids)} accounts...")
+    async with websockets.connect(url, max_size=None) as connection:
+        while True:
+            try:
+                message = await asyncio.wait_for(connection.recv(), max(0.0, next_check - time.monotonic()))
+            except asyncio.TimeoutError:
+                message = None
+            if message is not None:
+                await queue.put(json.loads(message))
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + __resubscribe_check_seconds__
+                if set(_watched_handles(config)) != handles:
+                    logger.info("Watched Bluesky accounts changed, resubscribing...")
+                    return
+
+async def _read_replay(path, dids, cursor, queue):
+    """Feed events from a JSON-lines Jetstream capture, honoring the cursor like the live service."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event.get('did') in dids and (cursor is None or event.get('time_us', 0) > cursor):
+                await queue.put(event)
+
+async def _consume_stream(queue, store, config):
+    """Turn stream events into analysis batches and advance the persisted cursor."""
+    flush_seconds = config['bluesky'].get('stream_flush_seconds', __default_flush_seconds__)
+    handles_by_did = {}
+    while True:
+        events = [await queue.get()]
+        deadline = time.monotonic() + flush_seconds
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                events.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            if not handles_by_did or any(event.get('did') not in handles_by_did for event in events):
+                handles_by_did = {did: handle for handle, did in _cached_dids(store, config).items()}
+            pending = PendingPosts('bluesky', store)
+            for event in events:
+                post = _post_from_event(event)
+                handle = handles_by_did.get(event.get('did'))
+                if post and handle and pending.add(handle, post[0], post[1]):
+                    logger.info(f"Found {len(pending)} posts to process...")
+
+            cursor = max(event.get('time_us', 0) for event in events)
+            if cursor:
+                pending.advance(__stream_marker__, cursor)
+            await pending.submit(config)
+        except Exception as e:
+            # Drop the batch but keep consuming, or the reader would block on a full queue
+            logger.error(f"Failed to process {len(events)} stream events: {e}")
+        finally:
+            for _ in events:
+                queue.task_done()
+
+def _post_from_event(event):
+    """Return (uri, text) for a post-creation commit event, or None for anything else."""
+    commit = event.get('commit') or {}
+    if event.get('kind') != 'commit' or commit.get('operation') != 'create' or commit.get('collection') != __post_collection__:
+        return None
+    text = (commit.get('record') or {}).get('text')
+    if not text:
+        return None
+    return f"at://{event['did']}/{__post_collection__}/{commit['rkey']}", text
+
+async def _resolve_dids(client, handles, store, config):
+    """Map handles to DIDs, using the persisted cache and resolving the rest concurrently.
+
+    Accounts configured by DID ("did:plc:...") are used as-is. Cached DIDs
+    are re-resolved after bluesky.did_ttl seconds; if that fails the old one
+    is kept.
+    """
+    ttl = config['bluesky'].get('did_ttl', __default_did_ttl__)
+    now = time.time()
+    dids = {}
+    jobs = {}
+    for handle in handles:
+        if handle.startswith('did:'):
+            dids[handle] = handle  # Already a DID, nothing to resolve
+            continue
+        cached = store.get_account_id('bluesky', handle)
+        if cached:
+            dids[handle] = cached[0]
+        if not cached or now - cached[1] > ttl:
+            jobs[handle] = functools.partial(client.resolve_handle, handle)
+
+    if jobs:
+        logger.info(f"Resolving DIDs for {len(jobs)} accounts...")
+    for handle, response in (await fetch_accounts('bluesky', jobs, config)).items():
+        if isinstance(response, Exception):
+            _log_fetch_error(f"resolving the DID for @{handle}", response, config)
+        else:
+            dids[handle] = response.did
+            store.set_account_id('bluesky', handle, response.did)
+    return dids
+
+def _log_fetch_error(action, error, config):
+    """Log a failed request; a 429 also pauses every Bluesky fetch until the limit resets."""
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        seconds = _rate_limit_reset(response)
+        logger.error(f"Too many requests while {action}! Pausing Bluesky fetches for {seconds:.0f} seconds...")
+        pause_platform('bluesky', config, seconds)
     else:
-        logger.error("No results to process!")
+        logger.error(f"Error while {action}: {error}")
+
+def _rate_limit_reset(response):
+    """Return the seconds until a 429 response's ratelimit-reset (epoch seconds), or the default pause."""
+    try:
+        return max(float(response.headers['ratelimit-reset']) - time.time(), 1.0)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return __rate_limit_pause__
+
+def _cached_dids(store, config):
+    dids = {}
+    for handle in _watched_handles(config):
+        if handle.startswith('did:'):
+            dids[handle] = handle
+            continue
+        cached = store.get_account_id('bluesky', handle)
+        if cached:
+            dids[handle] = cached[0]
+    return dids
+
+def _watched_handles(config):
+    return [account['username'] for account in config['watch_accounts']
+            if account.get('platform', '').lower() == 'bluesky']
+
+def _parse_timestamp(value):
+    """Parse an AT Protocol ISO 8601 timestamp into an aware UTC datetime.
+
+    createdAt is set by the posting client, so fractional seconds of any
+    length, a 'Z' or '+hhmm' offset and a missing offset are all accepted;
+    fromisoformat before Python 3.11 takes only 3 or 6 fraction digits.
+    """
+    match = __timestamp_pattern__.match(value.strip())
+    if match is None:
+        raise ValueError(f"not an ISO 8601 timestamp: {value!r}")
+    base, fraction, offset = match.groups()
+    fraction = f".{(fraction + '000000')[:6]}" if fraction else ""
+    if offset in ('Z', 'z'):
+        offset = '+00:00'
+    elif offset and ':' not in offset:
+        offset = f"{offset[:3]}:{offset[3:]}"
+    parsed = datetime.datetime.fromisoformat(f"{base}{fraction}{offset or ''}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+def _timestamp_ms(value):
+    """Parse an AT Protocol timestamp into integer milliseconds since the epoch."""
+    return int(_parse_timestamp(value).timestamp() * 1000)
+
+def _high_water_ms(value):
+    """Read a stored high-water mark; older versions stored an ISO timestamp instead of epoch ms."""
+    return int(value) if str(value).isdigit() else _timestamp_ms(value)
+
+def _now_ms():
+    return int(time.time() * 1000)
@@ -0,0 +1,86 @@
+import asyncio
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from xcryptowatch import metrics
+from xcryptowatch.ratelimit import TokenBucket
+from xcryptowatch.log import main_logger as logger
+
+__default_max_workers__ = 8
+# Conservative defaults; override per platform with "rate_limit": {"requests": N, "window": seconds}
+__default_rate_limits__ = {
+    'twitter': {'requests': 300, 'window': 15 * 60},
+    'truth': {'requests': 300, 'window': 5 * 60},
+    'bluesky': {'requests': 3000, 'window': 5 * 60},
+}
+
+_buckets = {}     # platform -> (settings, TokenBucket)
+_executors = {}   # platform -> (max_workers, ThreadPoolExecutor)
+
+async def fetch_accounts(platform, jobs, config, cost=1):
+    """Run per-account fetches concurrently under the platform's rate limit.
+
+    ``jobs`` maps an account name to a zero-argument callable: either a
+    blocking one, which runs in the platform's thread pool, or a coroutine
+    function (e.g. a partial of an async client method), which is awaited on
+    the event loop. Each call takes ``cost`` tokens from the platform bucket,
+    and at most max_workers run at once. Returns {account: result}, where a
+    failed fetch's result is the exception it raised.
+    """
+    if not jobs:
+        return {}
+    bucket = get_bucket(platform, config)
+    max_workers, executor = _get_executor(platform, config)
+    slots = asyncio.Semaphore(max_workers)
+    loop = asyncio.get_running_loop()
+
+    async def run(job):
+        async with slots:
+            await bucket.acquire(cost)
+            call_start = time.monotonic()
+            try:
+                if inspect.iscoroutinefunction(job):
+                    return await job()
+                return await loop.run_in_executor(executor, job)
+            except Exception:
+                metrics.fetch_errors.inc(platform=platform)
+                raise
+            finally:
+                metrics.fetch_seconds.observe(time.monotonic() - call_start, platform=platform)
+
+    start = time.monotonic()
+    results = await asyncio.gather(*(run(job) for job in jobs.values()), return_exceptions=True)
+    logger.debug(f"Fetched {len(jobs)} {platform} accounts in {time.monotonic() - start:.2f}s "
+                 f"({bucket.available():.0f} requests left in bucket)")
+    return dict(zip(jobs, results))
+
+async def fetch_one(platform, job, config, cost=1):
+    """Run a single call under the platform's rate limit. Exceptions propagate."""
+    result = (await fetch_accounts(platform, {None: job}, config, cost))[None]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+def get_bucket(platform, config):
+    """Return the platform's token bucket, rebuilding it if its configured limit changed."""
+    settings = config.get(platform, {}).get('rate_limit', __default_rate_limits__[platform])
+    settings = (settings['requests'], settings['window'])
+    cached = _buckets.get(platform)
+    if cached is None or cached[0] != settings:
+        _buckets[platform] = (settings, TokenBucket(*settings))
+        logger.debug(f"{platform} rate limit: {settings[0]} requests per {settings[1]}s")
+    return _buckets[platform][1]
+
+def pause_platform(platform, config, seconds):
+    """Hold off every fetch for a platform, e.g. after it reported a rate-limit hit."""
+    metrics.rate_limit_hits.inc(platform=platform)
+    get_bucket(platform, config).pause(seconds)
+
+def _get_executor(platform, config):
+    max_workers = config.get(platform, {}).get('max_workers', __default_max_workers__)
+    cached = _executors.get(platform)
+    if cached is None or cached[0] != max_workers:
+        if cached is not None:
+            cached[1].shutdown(wait=False)
+        _executors[platform] = (max_workers, ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"xcryptowatch-{platform}"))
+    return _executors[platform]
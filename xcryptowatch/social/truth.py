@@ -1,54 +1,170 @@
 import datetime
-import asyncio
+import functools
+import time
 import xcryptowatch.mail as mail
 from xcryptowatch.log import truth_logger as logger
-from xcryptowatch.gpt import analyze_posts_concurrently
+from xcryptowatch.pipeline import PendingPosts
+from xcryptowatch.store import get_store
+from xcryptowatch.polling import poll_interval, rebalance, record_poll
+from xcryptowatch.scheduler import create_scheduler
+from xcryptowatch.social.fetch import fetch_accounts, fetch_one, pause_platform
+
+__default_account_id_ttl__ = 7 * 24 * 60 * 60  # seconds
+__default_max_pages__ = 5
+__sync_key__ = "@sync"  # Scheduler key of the job that keeps per-account polls in sync with the config
+__rate_limit_error__ = "too many requests"  # The API's error message on a 429; truthbrush returns it instead of raising
+__rate_limit_pause__ = 5 * 60  # seconds, when the client saw no x-ratelimit-reset
 
 async def watch_truths(client, config):
-    watched_posts = []
+    store = get_store()
     await mail.status_update(f"Starting new truth watch at {datetime.datetime.now(datetime.timezone.utc)}.", config)
 
-    while True:
-        start_time = datetime.datetime.now(datetime.timezone.utc)# - datetime.timedelta(days=1)
-        to_process = []
-        for account in config['watch_accounts']:
-            if account.get('platform', '').lower() != 'truth':
-                continue
-            account_username = account['username']
-            logger.info(f"Fetching posts for @{account_username}...")
-            posts = client.pull_statuses(username=account_username, created_after=start_time)
-            post_list = list(posts)
-            if post_list:
-                for post in post_list:
-                    if post['id'] not in watched_posts:
-                        watched_posts.append(post['id'])
-                    to_process.append(post['content'])
-                    logger.info(f"Found {len(to_process)} posts to process...")
-                    if len(watched_posts) > 100 * len(config['watch_accounts']):
-                        watched_posts = watched_posts[-(100 * len(config['watch_accounts'])):]
-            else:
-                logger.error(f"Fetched user contains no data (posts may be too old)! Account: @{account_username}. Moving to next account...")
-
-        if to_process:
-            await _process_posts(to_process, config)
-        to_process.clear()
-
-        logger.info(f"Waiting for {config['truth']['check_interval']} minutes till next post check...")
-        await asyncio.sleep(60*int(config['truth']['check_interval']))
-
-# Post processing
-
-async def _process_posts(posts, config):
-    results = await analyze_posts_concurrently(posts)
-    if results:
-        for i, result in enumerate(results):
-            if not result:
-                logger.error(f"Task {i} returned error!")
-            elif result == "nothing":
-                logger.debug(f"Task {i}: No crypto mention.")
-            else:
-                logger.info(f"Task {i} returned result: {result}")
-                logger.info(f"Task {i} sending result to any configured emails...")
-                await mail.send_analysis(result, config)
+    scheduler = create_scheduler('truth', config)
+    start_time = datetime.datetime.now(datetime.timezone.utc)# - datetime.timedelta(days=1)
+    scheduler.schedule(__sync_key__, functools.partial(_sync_accounts, client, store, config, scheduler, start_time),
+                       lambda: 60*int(config['truth']['check_interval']), spread=False)
+    await scheduler.run()
+
+async def _sync_accounts(client, store, config, scheduler, start_time):
+    """Resolve the watched accounts and keep one scheduled poll job per account."""
+    usernames = [account['username'] for account in config['watch_accounts']
+                 if account.get('platform', '').lower() == 'truth']
+    account_ids = await _resolve_account_ids(client, usernames, store, config)
+
+    for account_username, account_id in account_ids.items():
+        scheduler.schedule(account_username, functools.partial(_poll_account, client, store, config, account_username, account_id, start_time),
+                           functools.partial(poll_interval, 'truth', account_username, config))
+    for key in scheduler.keys() - set(account_ids) - {__sync_key__}:
+        scheduler.cancel(key)
+    rebalance('truth', account_ids, config)
+    logger.debug(f"Polling {len(account_ids)} accounts...")
+
+async def _poll_account(client, store, config, account_username, account_id, start_time):
+    """Read an account's new statuses, newest first, one rate-limited request per page.
+
+    Reading stops at the first status that is not new (at or below since_id,
+    or on the first poll, older than start_time), so an idle account costs a
+    single request. If paging stops at truth.max_pages, the rest is skipped
+    with a warning.
+    """
+    since_id = store.get_high_water('truth', account_username)
+    max_pages = config['truth'].get('max_pages', __default_max_pages__)
+    params = {'exclude_replies': 'true'}
+    if since_id:
+        params['since_id'] = since_id  # Lets the server leave out statuses we already have
+    post_list = []
+    more = False
+    try:
+        for _ in range(max_pages):
+            page = await fetch_one('truth', functools.partial(_fetch_statuses, client, account_id, dict(params)), config)
+            new_posts = _new_posts(page, since_id, start_time)
+            post_list.extend(new_posts)
+            more = bool(page) and len(new_posts) == len(page)
+            if not more:
+                break
+            params['max_id'] = page[-1]['id']
+    except Exception as e:
+        _log_fetch_error(f"fetching posts for @{account_username}", e, client, config)
+        return
+    if more:
+        logger.warning(f"@{account_username} has more than {max_pages} pages of new posts! Older ones are skipped.")
+    if not post_list:
+        logger.debug(f"No new posts for @{account_username}.")
+        return
+
+    record_poll('truth', account_username, [_parse_timestamp(post['created_at']).timestamp() for post in post_list], config)
+    pending = PendingPosts('truth', store)
+    for post in post_list:
+        if pending.add(account_username, post['id'], post['content']):
+            logger.info(f"Found {len(pending)} posts to process...")
+    pending.advance(account_username, max(int(post['id']) for post in post_list))
+    await pending.submit(config)
+
+async def _resolve_account_ids(client, usernames, store, config):
+    """Map usernames to account ids, using the persisted cache and looking up the rest.
+
+    truthbrush's pull_statuses looks the account up on every call, doubling
+    the requests per account; with the id cached each poll is one request.
+    Ids older than truth.account_id_ttl seconds are looked up again, and a
+    failed revalidation keeps the old id.
+    """
+    ttl = config['truth'].get('account_id_ttl', __default_account_id_ttl__)
+    now = time.time()
+    account_ids = {}
+    jobs = {}
+    for username in usernames:
+        cached = store.get_account_id('truth', username)
+        if cached:
+            account_ids[username] = cached[0]
+        if not cached or now - cached[1] > ttl:
+            jobs[username] = functools.partial(client.lookup, username)
+    # The statuses endpoint is called directly and needs the token lookup() obtains on first use
+    if not jobs and account_ids and not getattr(client, 'auth_id', None):
+        username = next(iter(account_ids))
+        jobs[username] = functools.partial(client.lookup, username)
+
+    if not jobs:
+        return account_ids
+
+    logger.info(f"Looking up account ids for {len(jobs)} accounts...")
+    results = await fetch_accounts('truth', jobs, config)
+    for username, account in results.items():
+        if isinstance(account, dict) and 'error' in account:
+            account = RuntimeError(f"API returned an error: {account['error']}")
+        if isinstance(account, Exception):
+            _log_fetch_error(f"looking up @{username}", account, client, config)
+        elif isinstance(account, dict) and account.get('id'):
+            account_ids[username] = str(account['id'])
+            store.set_account_id('truth', username, account['id'])
+        else:
+            logger.error(f"Unable to look up @{username}! Account may be renamed, suspended or deleted.")
+            account_ids.pop(username, None)
+            store.forget_account_id('truth', username)
+    return account_ids
+
+def _fetch_statuses(client, account_id, params):
+    """Blocking fetch of one page of an account's statuses, newest first; runs in the Truth fetch pool."""
+    page = client._get(f"/v1/accounts/{account_id}/statuses", params=params)
+    if page is None:
+        raise RuntimeError("Request failed, see the truthbrush log")
+    if isinstance(page, dict) and 'error' in page:
+        raise RuntimeError(f"API returned an error: {page['error']}")
+    return sorted(page, key=lambda post: int(post['id']), reverse=True)
+
+def _new_posts(page, since_id, start_time):
+    """Return the leading statuses of a newest-first page that are new."""
+    new_posts = []
+    for post in page:
+        if since_id:
+            # Resume after the newest status we have already seen, even across restarts
+            if int(post['id']) <= int(since_id):
+                break
+        elif _parse_timestamp(post['created_at']) <= start_time:
+            break
+        new_posts.append(post)
+    return new_posts
+
+def _log_fetch_error(action, error, client, config):
+    """Log a failed request; a rate-limit error also pauses every Truth fetch until the limit resets."""
+    if __rate_limit_error__ in str(error).lower():
+        seconds = _rate_limit_reset(client)
+        logger.error(f"Too many requests while {action}! Pausing Truth fetches for {seconds:.0f} seconds...")
+        pause_platform('truth', config, seconds)
     else:
-        logger.error("No results to process!")
+        logger.error(f"Error while {action}: {error}")
+
+def _rate_limit_reset(client):
+    """Return the seconds until the x-ratelimit-reset truthbrush last saw, or the default pause."""
+    reset = getattr(client, 'ratelimit_reset', None)
+    if not isinstance(reset, datetime.datetime):
+        return __rate_limit_pause__
+    if reset.tzinfo is None:
+        reset = reset.replace(tzinfo=datetime.timezone.utc)
+    seconds = (reset - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+    return seconds if seconds > 0 else __rate_limit_pause__
+
+def _parse_timestamp(value):
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
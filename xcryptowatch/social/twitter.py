@@ -1,69 +1,311 @@
 import datetime
+import functools
+import time
 #from datetime import timedelta
 import tweepy
 import tweepy.errors
 import xcryptowatch.mail as mail
 from xcryptowatch.log import twitter_logger as logger
-from xcryptowatch.gpt import analyze_posts_concurrently
-import asyncio
+from xcryptowatch.pipeline import PendingPosts
+from xcryptowatch.store import get_store
+from xcryptowatch.polling import poll_interval, rebalance, record_poll
+from xcryptowatch.scheduler import create_scheduler
+from xcryptowatch.social.fetch import fetch_accounts, fetch_one, pause_platform
+
+__default_user_id_ttl__ = 7 * 24 * 60 * 60  # seconds
+__user_lookup_batch__ = 100  # Maximum usernames per multi-user lookup request
+__default_list_name__ = "xcryptowatch"
+__default_max_pages__ = 5
+__default_search_query_length__ = 512  # Recent search query limit on the Basic tier
+# High-water mark keys for the shared List and search timelines
+__list_marker__ = "@list"
+__search_marker__ = "@search"
+__sync_key__ = "@sync"  # Scheduler key of the job that keeps the poll jobs in sync with the config
+
+_list_members = {}  # list id -> set of member ids as of the last sync
 
 async def watch_tweets(client, config):
-    watched_tweets = []
+    store = get_store()
     await mail.status_update(f"Starting new twitter watch at {datetime.datetime.now(datetime.timezone.utc)}.", config)
-    
+
+    scheduler = create_scheduler('twitter', config)
+    start_time = datetime.datetime.now(datetime.timezone.utc) # - datetime.timedelta(days=7)
+    scheduler.schedule(__sync_key__, functools.partial(_sync_polls, client, store, config, scheduler, start_time),
+                       functools.partial(_check_interval, config), spread=False)
+    await scheduler.run()
+
+async def _sync_polls(client, store, config, scheduler, start_time):
+    """Keep the scheduled poll jobs in line with the watched accounts and the ingestion mode.
+
+    The accounts mode gets one job per account; the list and search modes
+    get a single job that reads all accounts at once.
+    """
+    usernames = [account['username'] for account in config['watch_accounts']
+                 if account.get('platform', '').lower() == 'twitter']
+
+    mode = config['twitter'].get('ingest_mode', 'accounts')
+    if mode == 'search':
+        polls = {__search_marker__: functools.partial(_poll_search, client, usernames, store, config, start_time)}
+    else:
+        user_ids = await _resolve_user_ids(client, usernames, store, config)
+        if mode == 'list':
+            polls = {__list_marker__: functools.partial(_poll_list, client, user_ids, store, config, start_time)}
+        else:
+            polls = {account_username: functools.partial(_poll_account, client, store, config, account_username, user_id, start_time)
+                     for account_username, user_id in user_ids.items()}
+            rebalance('twitter', user_ids, config)
+
+    for key, poll in polls.items():
+        if mode == 'accounts':
+            scheduler.schedule(key, functools.partial(_submit_after, store, config, poll), functools.partial(poll_interval, 'twitter', key, config))
+        else:
+            scheduler.schedule(key, functools.partial(_submit_after, store, config, poll), functools.partial(_check_interval, config), spread=False)
+    for key in scheduler.keys() - set(polls) - {__sync_key__}:
+        scheduler.cancel(key)
+
+async def _submit_after(store, config, poll):
+    """Run one poll, queue the new tweets it found for analysis, then record them as seen."""
+    pending = PendingPosts('twitter', store)
+    await poll(pending)
+    await pending.submit(config)
+
+def _check_interval(config):
+    return 60*int(config['twitter']['check_interval'])
+
+async def _poll_account(client, store, config, account_username, user_id, start_time, pending):
+    """Default ingestion: one paged timeline read per watched account.
+
+    Pages are followed with next_token until the account's new tweets are
+    exhausted, or twitter.max_pages, so a burst between polls is not cut
+    short. If paging stops at the cap, the rest is skipped with a warning.
+    """
+    since_id = store.get_high_water('twitter', account_username)
+    max_pages = config['twitter'].get('max_pages', __default_max_pages__)
+    tweets = []
+    token = None
+    try:
+        for _ in range(max_pages):
+            page = await fetch_one('twitter', functools.partial(_fetch_tweets, client, user_id, since_id, start_time, token), config)
+            tweets.extend(page.data or [])
+            token = page.meta.get('next_token')
+            if not token:
+                break
+    except Exception as e:
+        _log_fetch_error(f"fetching tweets for @{account_username}", e, config)
+        return
+    if token:
+        logger.warning(f"@{account_username} has more than {max_pages} pages of new tweets! Older ones are skipped.")
+    if not tweets:
+        logger.debug(f"No new tweets for @{account_username}.")
+        return
+
+    record_poll('twitter', account_username, [tweet.created_at.timestamp() for tweet in tweets], config)
+    _collect_tweets(account_username, tweets, pending)
+    pending.advance(account_username, max(tweet.id for tweet in tweets))
+
+async def _poll_list(client, user_ids, store, config, start_time, pending):
+    """List ingestion: keep a private List in sync with the watched accounts and read its timeline.
+
+    The List timeline has no since_id parameter, so pages are read newest
+    first until one reaches the last tweet id seen, or twitter.max_pages.
+    The List is private, so it is read with user auth, not the bearer token.
+    """
+    try:
+        list_id = await _sync_managed_list(client, user_ids, store, config)
+    except Exception as e:
+        _log_fetch_error("syncing the managed list", e, config)
+        return
+
+    since_id = store.get_high_water('twitter', __list_marker__)
+    usernames_by_id = {str(user_id): username for username, user_id in user_ids.items()}
+    max_pages = config['twitter'].get('max_pages', __default_max_pages__)
+    tweets = []
+    token = None
+    try:
+        for _ in range(max_pages):
+            page = await fetch_one('twitter', functools.partial(
+                client.get_list_tweets, list_id, max_results=100, pagination_token=token,
+                tweet_fields=['created_at', 'text', 'author_id'], user_auth=True
+            ), config)
+            page_tweets = page.data or []
+            tweets.extend(page_tweets)
+            token = page.meta.get('next_token')
+            if not token or any(_is_old(tweet, since_id, start_time) for tweet in page_tweets):
+                break
+    except Exception as e:
+        _log_fetch_error("fetching the managed list timeline", e, config)
+        return
+
+    new_tweets = [tweet for tweet in tweets if not _is_old(tweet, since_id, start_time)]
+    logger.info(f"Fetched {len(new_tweets)} new tweets from the managed list...")
+    _collect_by_author(new_tweets, usernames_by_id, pending)
+    if tweets:
+        pending.advance(__list_marker__, max(int(tweet.id) for tweet in tweets))
+
+async def _poll_search(client, usernames, store, config, start_time, pending):
+    """Search ingestion: batched 'from:a OR from:b' recent-search queries with since_id.
+
+    All queries share one since_id, advanced only when every query succeeded,
+    so a failed query is retried from the same point next cycle.
+    """
+    since_id = store.get_high_water('twitter', __search_marker__)
+    max_length = config['twitter'].get('search_query_length', __default_search_query_length__)
+    max_pages = config['twitter'].get('max_pages', __default_max_pages__)
+    queries = _build_search_queries(usernames, max_length)
+    newest = int(since_id) if since_id else 0
+    complete = True
+
+    logger.info(f"Searching tweets for {len(usernames)} accounts in {len(queries)} queries...")
+    for query in queries:
+        token = None
+        try:
+            for _ in range(max_pages):
+                params = {'since_id': since_id} if since_id else {'start_time': start_time}
+                page = await fetch_one('twitter', functools.partial(
+                    client.search_recent_tweets, query, max_results=100, next_token=token,
+                    tweet_fields=['created_at', 'text', 'author_id'], expansions=['author_id'],
+                    user_fields=['username'], **params
+                ), config)
+                usernames_by_id = {str(user.id): user.username for user in page.includes.get('users', [])}
+                _collect_by_author(page.data or [], usernames_by_id, pending)
+                newest = max([newest] + [int(tweet.id) for tweet in page.data or []])
+                token = page.meta.get('next_token')
+                if not token:
+                    break
+        except Exception as e:
+            _log_fetch_error(f"searching tweets with query '{query}'", e, config)
+            complete = False
+
+    if complete and newest:
+        pending.advance(__search_marker__, newest)
+
+async def _sync_managed_list(client, user_ids, store, config):
+    """Create the private List on first use and make its members match the watched accounts."""
+    name = config['twitter'].get('list_name', __default_list_name__)
+    cached = store.get_account_id('twitter-list', name)
+    if cached:
+        list_id = cached[0]
+    else:
+        logger.info(f"Creating private list '{name}' for watched accounts...")
+        response = await fetch_one('twitter', functools.partial(
+            client.create_list, name, description="Accounts watched by xcryptowatch", private=True
+        ), config)
+        list_id = str(response.data['id'])
+        store.set_account_id('twitter-list', name, list_id)
+
+    wanted = {str(user_id) for user_id in user_ids.values()}
+    if _list_members.get(list_id) == wanted:
+        return list_id
+
+    members = set()
+    token = None
     while True:
-        start_time = datetime.datetime.now(datetime.timezone.utc) # - datetime.timedelta(days=7)
-        to_process = []
-        for account in config['watch_accounts']:
-            if account.get('platform', '').lower() != 'twitter':
-                continue
-                
-            account_username = account['username']
-            logger.info(f"Fetching tweets for @{account_username}...")
-            try:
-                user = client.get_user(username=account_username)
-                if user.data:
-                    tweets = client.get_users_tweets(user.data.id, max_results=5, start_time=start_time, tweet_fields=['created_at', 'text'])
-                    if tweets.data:
-                        for tweet in tweets.data:
-                            if tweet.created_at > start_time and tweet.id not in watched_tweets:
-                                to_process.append(tweet.text)
-                                watched_tweets.append(tweet.id)
-                                logger.info(f"Found {len(to_process)} tweets to process...")
-                                if len(watched_tweets) > 100 * len(config['watch_accounts']):
-                                    watched_tweets = watched_tweets[-(100 * len(config['watch_accounts'])):]
-                    else:
-                        logger.error(f"Fetched user contains no data (tweets may be too old)! Account: @{account_username}. Moving to next account...")
-            except tweepy.errors.TooManyRequests as e:
-                logger.error(f"Too many requests! Waiting 15 minutes...")
-                await asyncio.sleep(15*60)
-            except tweepy.errors.TweepyException as e:
-                logger.error(f"Tweepy error while fetching tweets for @{account_username}: {str(e).replace('\n', ' ')} Waiting 60 seconds...")
-                #await asyncio.sleep(60)
-            except Exception as e:
-                logger.error(f"General error while fetching tweets for @{account_username}: {str(e).replace('\n', ' ')} Waiting 60 seconds...")
-                #await asyncio.sleep(60)
-        
-        logger.info("Tweets finished fetching...")
-        if to_process:
-            await _process_tweets(to_process, config)
-        to_process.clear()
-
-        logger.info(f"Waiting for {config['twitter']['check_interval']} minutes till next tweet check...")
-        await asyncio.sleep(60*int(config['twitter']['check_interval']))
-
-async def _process_tweets(tweets, config):
-    results = await analyze_posts_concurrently(tweets)
-    if results:
-        for i, result in enumerate(results):
-            if not result:
-                logger.error(f"Task {i} returned error!")
-            elif result == "nothing":
-                logger.debug(f"Task {i}: No crypto mention.")
-            else:
-                logger.info(f"Task {i} returned result: {result}")
-                logger.info(f"Task {i} sending result to any configured emails...")
-                await mail.send_analysis(result, config)
+        page = await fetch_one('twitter', functools.partial(
+            client.get_list_members, list_id, max_results=100, pagination_token=token, user_auth=True
+        ), config)
+        members.update(str(user.id) for user in page.data or [])
+        token = page.meta.get('next_token')
+        if not token:
+            break
+
+    for user_id in wanted - members:
+        await fetch_one('twitter', functools.partial(client.add_list_member, list_id, user_id), config)
+    for user_id in members - wanted:
+        await fetch_one('twitter', functools.partial(client.remove_list_member, list_id, user_id), config)
+    logger.info(f"Synced list '{name}': {len(wanted - members)} added, {len(members - wanted)} removed.")
+    _list_members[list_id] = wanted
+    return list_id
+
+def _build_search_queries(usernames, max_length):
+    """Pack 'from:' clauses into as few OR queries as fit in max_length characters."""
+    queries = []
+    current = []
+    for username in usernames:
+        clause = f"from:{username}"
+        if current and len(" OR ".join(current + [clause])) > max_length:
+            queries.append(" OR ".join(current))
+            current = []
+        current.append(clause)
+    if current:
+        queries.append(" OR ".join(current))
+    return queries
+
+def _is_old(tweet, since_id, start_time):
+    if since_id:
+        return int(tweet.id) <= int(since_id)
+    return tweet.created_at <= start_time
+
+def _collect_tweets(account_username, tweets, pending):
+    """Queue tweets that have not been seen before."""
+    for tweet in tweets:
+        if pending.add(account_username, tweet.id, tweet.text):
+            logger.info(f"Found {len(pending)} tweets to process...")
+
+def _collect_by_author(tweets, usernames_by_id, pending):
+    """Queue unseen tweets from a mixed timeline, attributing each to its author."""
+    for tweet in tweets:
+        account_username = usernames_by_id.get(str(tweet.author_id))
+        if account_username is None:
+            continue  # Not a watched account, e.g. a stale List member
+        _collect_tweets(account_username, [tweet], pending)
+
+def _log_fetch_error(action, error, config):
+    if isinstance(error, tweepy.errors.TooManyRequests):
+        logger.error(f"Too many requests while {action}! Pausing Twitter fetches for 15 minutes...")
+        pause_platform('twitter', config, 15*60)
+    elif isinstance(error, tweepy.errors.TweepyException):
+        logger.error(f"Tweepy error while {action}: {_one_line(error)}")
     else:
-        logger.error("No results to process!")
+        logger.error(f"General error while {action}: {_one_line(error)}")
+
+async def _resolve_user_ids(client, usernames, store, config):
+    """Map usernames to user ids, using the persisted cache and bulk lookups for the rest.
+
+    Cached ids older than twitter.user_id_ttl seconds are looked up again so
+    renamed or deleted accounts are noticed. If a revalidation lookup fails,
+    the old id keeps being used.
+    """
+    ttl = config['twitter'].get('user_id_ttl', __default_user_id_ttl__)
+    now = time.time()
+    user_ids = {}
+    to_resolve = []
+    for username in usernames:
+        cached = store.get_account_id('twitter', username)
+        if cached:
+            user_ids[username] = cached[0]
+        if not cached or now - cached[1] > ttl:
+            to_resolve.append(username)
+
+    if not to_resolve:
+        return user_ids
+
+    logger.info(f"Resolving user ids for {len(to_resolve)} accounts...")
+    chunks = [to_resolve[i:i + __user_lookup_batch__] for i in range(0, len(to_resolve), __user_lookup_batch__)]
+    jobs = {i: functools.partial(client.get_users, usernames=chunk) for i, chunk in enumerate(chunks)}
+    results = await fetch_accounts('twitter', jobs, config)
+    for i, response in results.items():
+        if isinstance(response, Exception):
+            _log_fetch_error(f"resolving user ids for {', '.join(chunks[i])}", response, config)
+            continue
+
+        found = {user.username.lower(): user.id for user in (response.data or [])}
+        for username in chunks[i]:
+            if username.lower() in found:
+                user_ids[username] = found[username.lower()]
+                store.set_account_id('twitter', username, found[username.lower()])
+            else:
+                logger.error(f"Unable to resolve user id for @{username}! Account may be renamed, suspended or deleted.")
+                user_ids.pop(username, None)
+                store.forget_account_id('twitter', username)
+    return user_ids
+
+def _fetch_tweets(client, user_id, since_id, start_time, token=None):
+    """Blocking fetch of one page of an account's new tweets; runs in the Twitter fetch pool."""
+    if since_id:
+        # Resume after the newest tweet we have already seen, even across restarts
+        return client.get_users_tweets(user_id, max_results=100, since_id=since_id, pagination_token=token, tweet_fields=['created_at', 'text'])
+    return client.get_users_tweets(user_id, max_results=100, start_time=start_time, pagination_token=token, tweet_fields=['created_at', 'text'])
 
+def _one_line(e):
+    """Flatten a multi-line exception message for single-line logging."""
+    return str(e).replace('\n', ' ')
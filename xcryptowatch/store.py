@@ -0,0 +1,146 @@
+import sqlite3
+import time
+from xcryptowatch.dedup import BoundedSeenSet, __default_per_account__
+from xcryptowatch.log import main_logger as logger
+
+__default_store_path__ = "xcryptowatch.db"
+
+_store = None
+
+class SeenStore:
+    """Durable record of already-processed posts, shared by every watcher.
+
+    Posts are keyed by (platform, account, post id). Each account also keeps a
+    high-water mark (the newest post id or timestamp seen) so a watcher can
+    resume with since_id/cursor semantics after a restart.
+
+    Recent ids are also held in a BoundedSeenSet, so repeat sightings are
+    answered from memory. Both tiers keep at most ``per_account`` ids per
+    account; older ids are safe to forget because the high-water mark stops
+    them from being fetched again.
+    """
+
+    def __init__(self, path=__default_store_path__, per_account=__default_per_account__):
+        self.path = path
+        self.per_account = per_account
+        self._recent = BoundedSeenSet(per_account)
+        self._db = sqlite3.connect(path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS seen_posts ("
+                         "platform TEXT NOT NULL, account TEXT NOT NULL, post_id TEXT NOT NULL, seen_at REAL NOT NULL, "
+                         "PRIMARY KEY (platform, account, post_id))")
+        self._db.execute("CREATE TABLE IF NOT EXISTS high_water ("
+                         "platform TEXT NOT NULL, account TEXT NOT NULL, marker TEXT NOT NULL, updated_at REAL NOT NULL, "
+                         "PRIMARY KEY (platform, account))")
+        self._db.execute("CREATE TABLE IF NOT EXISTS account_ids ("
+                         "platform TEXT NOT NULL, account TEXT NOT NULL, account_id TEXT NOT NULL, resolved_at REAL NOT NULL, "
+                         "PRIMARY KEY (platform, account))")
+        self._db.commit()
+
+    def is_seen(self, platform, account, post_id):
+        """Return True if the post was already recorded."""
+        if ((platform, account.lower()), str(post_id)) in self._recent:
+            return True
+        row = self._db.execute("SELECT 1 FROM seen_posts WHERE platform = ? AND account = ? AND post_id = ?",
+                               (platform, account.lower(), str(post_id))).fetchone()
+        return row is not None
+
+    def mark_seen(self, platform, account, post_id):
+        """Record a post. Returns True if it was new, False if it had been seen before."""
+        if not self._recent.add((platform, account.lower()), str(post_id)):
+            return False
+        cursor = self._db.execute("INSERT OR IGNORE INTO seen_posts (platform, account, post_id, seen_at) VALUES (?, ?, ?, ?)",
+                                  (platform, account.lower(), str(post_id), time.time()))
+        self._db.commit()
+        return cursor.rowcount == 1
+
+    def mark_seen_many(self, platform, posts, high_water=None):
+        """Record (account, post id) pairs and {account: marker} high-water marks in one transaction.
+
+        Returns the pairs that were new. One commit covers the whole poll
+        instead of one per post. Every account written to is pruned, including
+        posters in list, timeline and stream modes, whose high-water mark is
+        kept under the feed's key instead of their own.
+        """
+        now = time.time()
+        new = []
+        touched = set()
+        with self._db:
+            for account, post_id in posts:
+                touched.add(account.lower())
+                if not self._recent.add((platform, account.lower()), str(post_id)):
+                    continue
+                cursor = self._db.execute("INSERT OR IGNORE INTO seen_posts (platform, account, post_id, seen_at) VALUES (?, ?, ?, ?)",
+                                          (platform, account.lower(), str(post_id), now))
+                if cursor.rowcount == 1:
+                    new.append((account, post_id))
+            for account, marker in (high_water or {}).items():
+                touched.add(account.lower())
+                self._db.execute("INSERT OR REPLACE INTO high_water (platform, account, marker, updated_at) VALUES (?, ?, ?, ?)",
+                                 (platform, account.lower(), str(marker), now))
+            for account in touched:
+                self._prune(platform, account)
+        return new
+
+    def get_high_water(self, platform, account):
+        """Return the stored high-water mark for an account, or None if it was never polled."""
+        row = self._db.execute("SELECT marker FROM high_water WHERE platform = ? AND account = ?",
+                               (platform, account.lower())).fetchone()
+        return row[0] if row else None
+
+    def set_high_water(self, platform, account, marker):
+        """Store the newest post id or timestamp seen for an account."""
+        self._db.execute("INSERT OR REPLACE INTO high_water (platform, account, marker, updated_at) VALUES (?, ?, ?, ?)",
+                         (platform, account.lower(), str(marker), time.time()))
+        self._prune(platform, account.lower())
+        self._db.commit()
+
+    def get_account_id(self, platform, account):
+        """Return (account_id, resolved_at) for a cached username lookup, or None."""
+        row = self._db.execute("SELECT account_id, resolved_at FROM account_ids WHERE platform = ? AND account = ?",
+                               (platform, account.lower())).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set_account_id(self, platform, account, account_id):
+        """Cache the platform id a username resolved to."""
+        self._db.execute("INSERT OR REPLACE INTO account_ids (platform, account, account_id, resolved_at) VALUES (?, ?, ?, ?)",
+                         (platform, account.lower(), str(account_id), time.time()))
+        self._db.commit()
+
+    def forget_account_id(self, platform, account):
+        """Drop a cached username lookup, e.g. when the account no longer exists."""
+        self._db.execute("DELETE FROM account_ids WHERE platform = ? AND account = ?", (platform, account.lower()))
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    def _prune(self, platform, account):
+        """Drop all but the newest per_account rows for an account."""
+        self._db.execute("DELETE FROM seen_posts WHERE platform = ? AND account = ? AND post_id NOT IN ("
+                         "SELECT post_id FROM seen_posts WHERE platform = ? AND account = ? ORDER BY seen_at DESC, rowid DESC LIMIT ?)",
+                         (platform, account, platform, account, self.per_account))
+
+def setup_store(config):
+    """Open the shared store at the configured path."""
+    global _store
+    path = config.get('storage', {}).get('path', __default_store_path__)
+    per_account = config.get('storage', {}).get('seen_per_account', __default_per_account__)
+    if _store is not None:
+        _store.close()
+    _store = SeenStore(path, per_account)
+    logger.info(f"Using seen-post store at {path}")
+    return _store
+
+def get_store():
+    """Return the shared store, opening the default path if setup_store() was never called."""
+    global _store
+    if _store is None:
+        _store = SeenStore()
+    return _store
+
+def close_store():
+    """Close the shared store, if it was opened."""
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None